@@ -1,8 +1,56 @@
+import argparse
+import sys
+import time
+
+startup_time = time.perf_counter()
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser(description="3D car racing game on an infinite highway")
+    parser.add_argument("--profile-log", metavar="CSV", help="write per-frame phase times to this file")
+    parser.add_argument("--offscreen", metavar="FILE",
+                        help="render without a window, writing raw RGB frames to FILE (- for stdout)")
+    parser.add_argument("--frames", type=int, default=600,
+                        help="number of frames to render with --offscreen, at most the length of a replay")
+    parser.add_argument("--record", metavar="REPLAY", help="save the seed and inputs of this session to REPLAY")
+    parser.add_argument("--replay", metavar="REPLAY", help="play back a recorded session instead of reading the keyboard")
+    parser.add_argument("--seed", type=int, help="seed for the game's random numbers (0 to 2**64 - 1)")
+    parser.add_argument("--timings", action="store_true", help="print how long startup and the first frame took")
+    parser.add_argument("--shaders", action="store_true", help="light the scene with GLSL shaders (needs OpenGL 3.3)")
+    parser.add_argument("--threaded", action="store_true",
+                        help="step the game on a worker thread (the profile then only times drawing)")
+    return parser
+
+
+# PyOpenGL's switches and, for offscreen mode, the EGL platform have to be set
+# before OpenGL.GL is imported. The full parser reads the command line here, so
+# --offscreen=FILE and abbreviations like --offs count too
+if __name__ == "__main__" and argument_parser().parse_known_args()[0].offscreen:
+    import offscreen  # noqa: F401
+import glconfig  # noqa: F401
+
 from OpenGL.GL import *
 from OpenGL.GLUT import *
-from OpenGL.GLU import *
 import math
-import random
+
+import numpy as np
+
+import simulation
+from simulation import Inputs, new_game, restart_game, step
+from timestep import FixedTimestep, capture_motion, interpolate_state
+from geometry import GeometryCache
+from instancing import TreeInstances, HouseInstances, TrafficInstances
+from road import RoadMesh
+from terrain import Terrain
+from culling import Frustum
+from meshes import translation, rotation
+import shaders
+from replay import INPUT_RESTART, Recorder, Replay, tick_inputs
+from hud import Hud
+from worker import SimulationWorker
+from profiler import FrameProfiler
+
+imports_done = time.perf_counter()
 
 window_width = 800
 window_height = 600
@@ -18,59 +66,72 @@ up_x = 0.0
 up_y = 1.0
 up_z = 0.0
 
-# Car
-car_x = 0.0
-car_y = 0.0
-car_z = 0.0
-car_rotation = 0.0
-car_speed = 0.0
-max_speed = 0.5
-max_reverse_speed = -0.1
-acceleration = 0.001
-deceleration = 0.001
-turning_speed = 0.2
-
-#movement
-move_forward = False
-move_backward = False
-turn_left = False
-turn_right = False
+#projection
+field_of_view = 60.0
+near_plane = 0.1
+far_plane = 1000.0
 
 first_person_view = False
-game_over = False
-score = 0
 
-#road
-road_width = 10.0
-road_segment_length = 20.0
-num_road_segments = 10
-terrain_size = 200.0
+# Drawn and total object counts from the last frame, shown with the 'c' key
+show_cull_stats = False
+cull_stats = {}
+
+# Game being played and the controls currently held down
+game = None
+inputs = Inputs()
+
+# Simulation ticks per second, and how many ticks one frame may run to catch up
+tick_rate = 60
+max_substeps = 5
+clock = FixedTimestep(tick_rate, max_substeps)
+previous_motion = None
+
+# Inputs of the game being played, kept with --record, or the ticks of a
+# recording driving the game instead of the keyboard with --replay
+recorder = None
+playback = None
 
-# Road segments and environment objects
-road_segments = []
-trees = []
-houses = []
-house_colors = []
-num_trees = 60
-num_houses = 20
+# Steps the game on its own thread with --threaded; the window then draws its snapshots
+worker = None
 
+# Car and wheel models, compiled once on first use
+geometry = GeometryCache()
 
-class CpuCar:
-    def __init__(self, x, z, speed, color):
-        self.x = x
-        self.z = z
-        self.speed = speed
-        self.color = color
-        self.overtaken = False
+# Road, roadside trees and houses, one draw call each, and heightmap tiles
+# around the car, meshed as they come into range. Built by init().
+road = None
+trees = None
+houses = None
+terrain = None
 
+# CPU cars drawn with one instanced call, where OpenGL 3.3 is available
+traffic_instances = None
 
-cpu_cars = []
-cpu_spawn_timer = 100
-cpu_spawn_interval = 250
+# Scene drawn with the GLSL pipeline instead of fixed-function lighting (--shaders)
+use_shaders = False
+pipeline = None
+
+# On-screen text, drawn from a glyph atlas built on the first frame
+hud = Hud()
+
+# Time spent in each phase of a frame, shown with the 'p' key every
+# profile_refresh frames and optionally logged to a CSV file
+simulation_phases = ["update_cpu_cars", "update_car", "update_road_segments", "update_environment_objects"]
+draw_phases = ["draw_terrain", "draw_road", "draw_environment", "draw_car", "draw_traffic", "hud", "swap"]
+profiler = FrameProfiler(simulation_phases + draw_phases)
+show_profile = False
+profile_refresh = 30
+profile_lines = []
+
+# Report how long imports, init() and the first frame took (--timings)
+show_timings = False
+init_done = None
 
 
 def init():
     """Initialize OpenGL settings"""
+    global road, trees, houses, terrain, traffic_instances, pipeline, init_done
     glClearColor(0.5, 0.7, 1.0, 1.0)
     glEnable(GL_DEPTH_TEST)
     glEnable(GL_COLOR_MATERIAL)
@@ -97,286 +158,60 @@ def init():
     glMaterialfv(GL_FRONT, GL_SPECULAR, mat_specular)
     glMaterialfv(GL_FRONT, GL_SHININESS, mat_shininess)
 
+    #scene geometry
+    road = RoadMesh()
+    trees = TreeInstances()
+    houses = HouseInstances()
+    terrain = Terrain()
+    if shaders.supported():
+        traffic_instances = TrafficInstances()
+        if use_shaders:
+            pipeline = shaders.ShaderPipeline()
+            pipeline.build()
+    elif use_shaders:
+        print("OpenGL 3.3 is not available, drawing without shaders", file=sys.stderr)
+    init_done = time.perf_counter()
 
-def generate_road_segments():
-    global road_segments
-    road_segments = []
-
-    for i in range(num_road_segments):
-        z_pos = -i * road_segment_length
-        road_segments.append(z_pos)
-
-
-def generate_environment_objects():
-    global trees, houses, house_colors
-    trees = []
-    houses = []
-    house_colors = []
-
-    for _ in range(num_trees):
-        side = random.choice([-1, 1])
-        x = side * (road_width / 2 + 2 + random.uniform(0.5, 3))
-        z = random.uniform(-road_segment_length * num_road_segments, 0)
-        scale = random.uniform(1.5, 3.0)
-        trees.append([x, z, scale])
-
-    for _ in range(num_houses):
-        side = random.choice([-1, 1])
-        x = side * (road_width / 2 + 10 + random.uniform(2, 7))
-        z = random.uniform(-road_segment_length * num_road_segments, 0)
-        house_type = random.randint(0, 2)
-        houses.append([x, z, house_type])
-        house_colors.append([random.uniform(0.2, 1.0), random.uniform(0.2, 1.0), random.uniform(0.2, 1.0)])
-
-
-def update_environment_objects():
-    global trees, houses
-
-    for tree in trees:
-        if tree[1] > car_z + road_segment_length * 2:
-            tree[1] -= road_segment_length * num_road_segments
-            side = random.choice([-1, 1])
-            tree[0] = side * (road_width / 2 + 2 + random.uniform(0.5, 3))
-            tree[2] = random.uniform(1.5, 3.0)
-
-    for house in houses:
-        if house[1] > car_z + road_segment_length * 2:
-            house[1] -= road_segment_length * num_road_segments
-            side = random.choice([-1, 1])
-            house[0] = side * (road_width / 2 + 8 + random.uniform(1, 5))
-            house[2] = random.randint(0, 2)  # New house type
-
-
-def update_road_segments():
-    global road_segments, score
-
-    furthest_segment = min(road_segments)
-    
-    if car_z < furthest_segment + (num_road_segments - 5) * road_segment_length:
-        new_segment = furthest_segment - road_segment_length
-        road_segments.append(new_segment)
 
-        if len(road_segments) > num_road_segments:
-            road_segments.remove(max(road_segments))
+def draw_terrain(state, frustum=None):
+    terrain.draw(state, frustum)
+    cull_stats["terrain"] = (terrain.drawn, terrain.in_range)
 
-            score += 1
 
-    update_environment_objects()
+def draw_road(state):
+    road.draw(state)
 
 
-def draw_terrain():
-    glPushMatrix()
-    glColor3f(0.0, 0.6, 0.0)
-
-    car_grid_x = round(car_x / terrain_size) * terrain_size
-
-    for x_offset in [-terrain_size, 0, terrain_size]:
-        for z_offset in [-terrain_size, 0, terrain_size]:
-            glBegin(GL_QUADS)
-            glVertex3f(car_grid_x + x_offset - terrain_size / 2, 0, car_z + z_offset - terrain_size / 2)
-            glVertex3f(car_grid_x + x_offset - terrain_size / 2, 0, car_z + z_offset + terrain_size / 2)
-            glVertex3f(car_grid_x + x_offset + terrain_size / 2, 0, car_z + z_offset + terrain_size / 2)
-            glVertex3f(car_grid_x + x_offset + terrain_size / 2, 0, car_z + z_offset - terrain_size / 2)
-            glEnd()
-
-    glPopMatrix()
-
-
-def draw_road():
-    glPushMatrix()
-    glColor3f(0.2, 0.2, 0.2)
-
-    for i in range(len(road_segments)):
-        segment_z = road_segments[i]
-        next_segment_z = road_segments[i + 1] if i + 1 < len(road_segments) else segment_z + road_segment_length
-
-        #road segment
-        glBegin(GL_QUADS)
-        glVertex3f(-road_width / 2, 0.01, segment_z)
-        glVertex3f(-road_width / 2, 0.01, segment_z + road_segment_length)
-        glVertex3f(road_width / 2, 0.01, segment_z + road_segment_length)
-        glVertex3f(road_width / 2, 0.01, segment_z)
-        glEnd()
-
-        #left-border
-        glColor3f(0.5, 0.5, 0.5)
-        glBegin(GL_QUADS)
-        glVertex3f(-road_width / 2 - 0.5, 0.0, segment_z)
-        glVertex3f(-road_width / 2 - 0.5, 0.5, segment_z)
-        glVertex3f(-road_width / 2 - 0.5, 0.5, next_segment_z)
-        glVertex3f(-road_width / 2 - 0.5, 0.0, next_segment_z)
-        glEnd()
-        glBegin(GL_QUADS)
-        glVertex3f(-road_width / 2 - 0.5, 0.5, segment_z)
-        glVertex3f(-road_width / 2, 0.5, segment_z)
-        glVertex3f(-road_width / 2, 0.5, next_segment_z)
-        glVertex3f(-road_width / 2 - 0.5, 0.5, next_segment_z)
-        glEnd()
-        glBegin(GL_QUADS)
-        glVertex3f(-road_width / 2, 0.5, segment_z)
-        glVertex3f(-road_width / 2, 0.0, segment_z)
-        glVertex3f(-road_width / 2, 0.0, next_segment_z)
-        glVertex3f(-road_width / 2, 0.5, next_segment_z)
-        glEnd()
-
-        #right-border
-        glBegin(GL_QUADS)
-        glVertex3f(road_width / 2 + 0.5, 0.0, segment_z)
-        glVertex3f(road_width / 2 + 0.5, 0.5, segment_z)
-        glVertex3f(road_width / 2 + 0.5, 0.5, next_segment_z)
-        glVertex3f(road_width / 2 + 0.5, 0.0, next_segment_z)
-        glEnd()
-        glBegin(GL_QUADS)
-        glVertex3f(road_width / 2 + 0.5, 0.5, segment_z)
-        glVertex3f(road_width / 2, 0.5, segment_z)
-        glVertex3f(road_width / 2, 0.5, next_segment_z)
-        glVertex3f(road_width / 2 + 0.5, 0.5, next_segment_z)
-        glEnd()
-        glBegin(GL_QUADS)
-        glVertex3f(road_width / 2, 0.5, segment_z)
-        glVertex3f(road_width / 2, 0.0, segment_z)
-        glVertex3f(road_width / 2, 0.0, next_segment_z)
-        glVertex3f(road_width / 2, 0.5, next_segment_z)
-        glEnd()
-
-        glColor3f(0.2, 0.2, 0.2)
-
-    #road striping
-    glColor3f(1.0, 1.0, 1.0)
-    stripe_length = 3.0
-    gap_length = 3.0
-    stripe_width = 0.3
-
-    start_z = min(road_segments)
-    end_z = max(road_segments) + road_segment_length
-
-    current_z = start_z
-    while current_z < end_z:
-        if int((current_z - start_z) / (stripe_length + gap_length)) % 2 == 0:
-            actual_length = min(stripe_length, end_z - current_z)
-            glBegin(GL_QUADS)
-            glVertex3f(-stripe_width / 2, 0.02, current_z)
-            glVertex3f(-stripe_width / 2, 0.02, current_z + actual_length)
-            glVertex3f(stripe_width / 2, 0.02, current_z + actual_length)
-            glVertex3f(stripe_width / 2, 0.02, current_z)
-            glEnd()
-
-        current_z += stripe_length if int((current_z - start_z) / (stripe_length + gap_length)) % 2 == 0 else gap_length
-
-    glPopMatrix()
-
-
-def draw_tree(x, z, scale):
-    glPushMatrix()
-
-    #tree position
-    glTranslatef(x, 0, z)
-    glScalef(scale, scale, scale)
-
-    glColor3f(0.4, 0.2, 0.1)
-    glPushMatrix()
-    glRotatef(-90, 1, 0, 0)
-    glutSolidCylinder(0.3, 3.0, 10, 2)
-    glPopMatrix()
-
-    #leaves
-    glColor3f(0.1, 0.7, 0.2)
-    glPushMatrix()
-    glTranslatef(0, 3.0, 0)
-    glutSolidSphere(1.5, 10, 10)
-    glPopMatrix()
-
-    glPopMatrix()
+def draw_environment(state, frustum=None):
+    trees.draw(state, frustum)
+    houses.draw(state, frustum)
+    cull_stats["trees"] = (trees.drawn, len(state.trees))
+    cull_stats["houses"] = (houses.drawn, len(state.houses))
 
 
-def draw_house(x, z, house_type, color):
-    glPushMatrix()
+def draw_traffic(state, frustum=None):
+    traffic = state.cpu_cars
+    count = traffic.count
+    if traffic_instances is not None and frustum is not None:
+        traffic_instances.draw(state, frustum)
+        cull_stats["cars"] = (traffic_instances.drawn, count)
+        return
 
-    glTranslatef(x, 0, z)
-    if x < 0:
-        glRotatef(90, 0, 1, 0)
+    x = traffic.x[:count]
+    z = traffic.z[:count]
+    if frustum is None:
+        visible = range(count)
     else:
-        glRotatef(-90, 0, 1, 0)
-
-    scale_factor = 2.0
-    house_width = 2.5 * scale_factor * 2.0
-    house_height = 2.0 * scale_factor * 1.5
-    house_depth = 2.5 * scale_factor
-
-    glColor3f(color[0], color[1], color[2])
-    glPushMatrix()
-    glTranslatef(0, house_height / 2, 0)
-    glScalef(house_width, house_height, house_depth)
-    glutSolidCube(1.0)
-    glPopMatrix()
-
-    # Roof
-    glColor3f(0.6, 0.2, 0.1)
-    glPushMatrix()
-    glTranslatef(0, house_height, 0)
-    glRotatef(-90, 1, 0, 0)
-    glutSolidCone(house_width / 2 * 1.7, 1.5 * scale_factor, 16, 16)
-    glPopMatrix()
-
-    #door
-    door_color = [random.uniform(0.2, 0.5), random.uniform(0.1, 0.3), random.uniform(0.0, 0.1)]
-    glColor3f(door_color[0], door_color[1], door_color[2])
-    glPushMatrix()
-    glTranslatef(0, 0.5 * scale_factor, house_depth / 2 + 0.01)
-    glScalef(0.6 * scale_factor, 1.2 * scale_factor, 0.1)
-    glutSolidCube(1.0)
-    glPopMatrix()
-
-    #windows
-    window_color = [random.uniform(0.4, 0.8), random.uniform(0.6, 0.9), random.uniform(0.7, 1.0)]
-    glColor3f(window_color[0], window_color[1], window_color[2])
-    window_positions = [
-        (-0.8 * scale_factor, 1.2 * scale_factor), (0.8 * scale_factor, 1.2 * scale_factor),
-        (-0.8 * scale_factor, 0.8 * scale_factor), (0.8 * scale_factor, 0.8 * scale_factor)
-    ]
-    for x_pos, y_pos in window_positions:
-        glPushMatrix()
-        glTranslatef(x_pos, y_pos, house_depth / 2 + 0.01)
-        glScalef(0.6 * scale_factor, 0.5 * scale_factor, 0.1)
-        glutSolidCube(1.0)
-        glPopMatrix()
-
-    glPopMatrix()
-
-
-def draw_environment():
-    for tree in trees:
-        draw_tree(tree[0], tree[1], tree[2])
-
-    for i, house in enumerate(houses):
-        draw_house(house[0], house[1], house[2], house_colors[i])
-
-
-def draw_wheel():
-    glPushMatrix()
-
-    glRotatef(90, 0, 1, 0)
-
-    #wheel rim
-    glColor3f(0.2, 0.2, 0.1)
-    glPushMatrix()
-    glutSolidCylinder(0.2, 0.1, 16, 8)
-    glPopMatrix()
-
-    #wheel tire
-    glColor3f(0.3, 0.3, 0.3)
-    glPushMatrix()
-    glTranslatef(0.0, 0.0, 0.05)
-    glutSolidSphere(0.08, 16, 8)
-    glPopMatrix()
-
-    glPopMatrix()
-
-
+        centers = np.stack([x, np.full(count, 0.5), z], axis=1)
+        visible = np.flatnonzero(frustum.spheres_visible(centers, np.full(count, 1.5)))
 
+    for i in visible:
+        draw_cpu_car(x[i], z[i], direction='forward', color=traffic.color[i])
+    cull_stats["cars"] = (len(visible), count)
 
 
 def draw_cpu_car(x, z, direction="forward", color=(0.0, 0.0, 1.0)):
+    top_color = (min(color[0] + 0.6, 1.0), min(color[1] + 0.6, 1.0), min(color[2] + 0.6, 1.0))
     glPushMatrix()
     glTranslatef(x, 0.5, z)
 
@@ -385,111 +220,43 @@ def draw_cpu_car(x, z, direction="forward", color=(0.0, 0.0, 1.0)):
 
     #bottombody
     glColor3f(color[0], color[1], color[2])
-    glPushMatrix()
-    glScalef(1.0, 0.5, 2.0)
-    glutSolidCube(0.9)
-    glPopMatrix()
+    geometry.draw("car_lower")
 
     #topbody
-    glColor3f(min(color[0] + 0.6, 1.0), min(color[1] + 0.6, 1.0), min(color[2] + 0.6, 1.0))
-    glPushMatrix()
-    glTranslatef(0.0, 0.4, 0.0)
-    glScalef(0.8, 0.4, 1.2)
-    glutSolidCube(1.0)
-    glPopMatrix()
+    glColor3f(*top_color)
+    geometry.draw("car_upper")
 
     # Wheels
-    wheel_offset = 0.6
-    wheel_height = -0.3
-
-    right_wheel_offset = wheel_offset - 0.1
-
-    # Front-left wheel
-    glPushMatrix()
-    glTranslatef(-wheel_offset, wheel_height, 0.7)
-    draw_wheel()
-    glPopMatrix()
-
-    glPushMatrix()
-    glTranslatef(right_wheel_offset, wheel_height, 0.7)
-    draw_wheel()
-    glPopMatrix()
-
-    # Rear-left wheel
-    glPushMatrix()
-    glTranslatef(-wheel_offset, wheel_height, -0.7)
-    draw_wheel()
-    glPopMatrix()
-
-    # Rear-right wheel
-    glPushMatrix()
-    glTranslatef(right_wheel_offset, wheel_height, -0.7)
-    draw_wheel()
-    glPopMatrix()
+    geometry.draw("car_wheels")
 
     glPopMatrix()
 
 
+def draw_car(state):
+    if pipeline is not None:
+        pipeline.transform(translation(state.car_x, state.car_y + 0.5, state.car_z)
+                           @ rotation(state.car_rotation, 0, 1, 0))
+        geometry.draw("player_car")
+        pipeline.transform(shaders.identity)
+        return
 
-def draw_car():
     glPushMatrix()
 
     #car position and rotation
-    glTranslatef(car_x, car_y + 0.5, car_z)
-    glRotatef(car_rotation, 0, 1, 0)
-
-    #topbody
-    glColor3f(1.0, 0.0, 0.0)
-    glPushMatrix()
-    glScalef(1.0, 0.5, 2.0)
-    glutSolidCube(0.9)
-    glPopMatrix()
-
-    #bottombody
-    glColor3f(0.8, 0.8, 1.0)
-    glPushMatrix()
-    glTranslatef(0.0, 0.4, 0.0)
-    glScalef(0.8, 0.4, 1.2)
-    glutSolidCube(1.0)
-    glPopMatrix()
-
-    #wheels
-    wheel_offset = 0.6
-    wheel_height = -0.3
-
-    right_wheel_offset = wheel_offset - 0.1
-
-    #front-left wheel
-    glPushMatrix()
-    glTranslatef(-wheel_offset, wheel_height, 0.7)  # Position left front wheel
-    draw_wheel()
-    glPopMatrix()
-
-    #front-right wheel
-    glPushMatrix()
-    glTranslatef(right_wheel_offset, wheel_height, 0.7)
-    draw_wheel()
-    glPopMatrix()
-
-    #rear-left wheel
-    glPushMatrix()
-    glTranslatef(-wheel_offset, wheel_height, -0.7)
-    draw_wheel()
-    glPopMatrix()
-
-    #rear-right wheel
-    glPushMatrix()
-    glTranslatef(right_wheel_offset, wheel_height, -0.7)
-    draw_wheel()
-    glPopMatrix()
+    glTranslatef(state.car_x, state.car_y + 0.5, state.car_z)
+    glRotatef(state.car_rotation, 0, 1, 0)
+    geometry.draw("player_car")
 
     glPopMatrix()
 
 
-
-def update_camera():
+def update_camera(state):
     global camera_x, camera_y, camera_z, look_x, look_y, look_z
 
+    car_x = state.car_x
+    car_z = state.car_z
+    car_rotation = state.car_rotation
+
     if first_person_view:
         angle_rad = math.radians(car_rotation)
         camera_x = car_x
@@ -504,101 +271,47 @@ def update_camera():
         camera_z = car_z + 5.0 * math.cos(angle_rad)
 
         look_x = car_x
-        look_y = car_y + 0.5
+        look_y = state.car_y + 0.5
         look_z = car_z
 
 
-def update_car():
-    update_cpu_cars()
-    global car_x, car_z, car_speed, car_rotation, game_over
-
-    if not game_over:
-        angle_rad = math.radians(car_rotation)
-
-        #car movement logics
-        if move_forward:
-            car_speed += acceleration
-            if car_speed > max_speed:
-                car_speed = max_speed
-        elif move_backward:
-            if car_speed > 0:
-                car_speed -= acceleration
-                if car_speed < 0:
-                    car_speed = 0
-        else:
-            if car_speed > 0:
-                car_speed -= deceleration
-                if car_speed < 0:
-                    car_speed = 0
-            elif car_speed < 0:
-                car_speed = 0
-
-        max_turn_angle = 90.0
-
-        if abs(car_speed) > 0.05:
-            if turn_left:
-                car_rotation += turning_speed * (abs(car_speed) / max_speed)
-                if car_rotation > max_turn_angle:
-                    car_rotation = max_turn_angle
-            if turn_right:
-                car_rotation -= turning_speed * (abs(car_speed) / max_speed)
-                if car_rotation < -max_turn_angle:
-                    car_rotation = -max_turn_angle
-
-        #carmovement
-        if car_speed != 0:
-            car_x += car_speed * math.sin(-angle_rad)
-            car_z -= car_speed * math.cos(-angle_rad)
-
-        wheel_offset = 0.6
-        if abs(car_x - wheel_offset) > road_width / 2 or abs(car_x + wheel_offset) > road_width / 2:
-            game_over = True
-
-        #collision check
-        for car in cpu_cars:
-            if (abs(car.x - car_x) < 1.0 and abs(car.z - car_z) < 1.0):
-                player_left_wheel = car_x - wheel_offset
-                player_right_wheel = car_x + wheel_offset
-
-                cpu_left_wheel = car.x - wheel_offset
-                cpu_right_wheel = car.x + wheel_offset
-
-                #left wheel collision
-                if abs(player_left_wheel - cpu_left_wheel) < 0.2 and abs(car.z - car_z) < 1.0:
-                    game_over = True
-
-                #right wheel collision
-                if abs(player_right_wheel - cpu_right_wheel) < 0.2 and abs(car.z - car_z) < 1.0:
-                    game_over = True
- 
-        update_road_segments()
-
-
-def display():
+def render(state):
+    """Draw the given game state into the current GL context"""
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
-    #camera
-    glMatrixMode(GL_PROJECTION)
-    glLoadIdentity()
-    gluPerspective(60, window_width / window_height, 0.1, 1000.0)
+    #camera, with the same matrices gluPerspective and gluLookAt would make
+    update_camera(state)
+    aspect = window_width / window_height
+    frustum = Frustum(field_of_view, aspect, near_plane, far_plane,
+                      (camera_x, camera_y, camera_z), (look_x, look_y, look_z), (up_x, up_y, up_z))
 
+    glMatrixMode(GL_PROJECTION)
+    glLoadTransposeMatrixd(frustum.projection)
     glMatrixMode(GL_MODELVIEW)
-    glLoadIdentity()
-
-    update_camera()
-    gluLookAt(camera_x, camera_y, camera_z,
-              look_x, look_y, look_z,
-              up_x, up_y, up_z)
+    glLoadTransposeMatrixd(frustum.view)
+    if pipeline is not None:
+        pipeline.begin(frustum)
 
     #scene components
-    draw_terrain()
-    draw_road()
-    draw_environment()
-    draw_car()
-    for car in cpu_cars:
-        draw_cpu_car(car.x, car.z, direction='forward', color=car.color)
-
-    #score and speed
+    with profiler.phase("draw_terrain"):
+        draw_terrain(state, frustum)
+    with profiler.phase("draw_road"):
+        draw_road(state)
+    with profiler.phase("draw_environment"):
+        draw_environment(state, frustum)
+    with profiler.phase("draw_car"):
+        draw_car(state)
+    with profiler.phase("draw_traffic"):
+        draw_traffic(state, frustum)
+    if pipeline is not None:
+        pipeline.end()
+
+    with profiler.phase("hud"):
+        draw_hud(state)
+
+
+def draw_hud(state):
+    """Draw the on-screen text over the scene"""
     glMatrixMode(GL_PROJECTION)
     glPushMatrix()
     glLoadIdentity()
@@ -607,53 +320,72 @@ def display():
     glPushMatrix()
     glLoadIdentity()
 
-    #display score
-    glColor3f(1.0, 1.0, 1.0)
-    glRasterPos2f(10, window_height - 20)
-    score_text = f"Score: {score}"
-    for character in score_text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(character))
+    hud.begin()
+
+    #display score and speed
+    hud.text("score", f"Score: {state.score}", 10, window_height - 20)
+    hud.text("speed", f"Speed: {state.car_speed:.2f}", 10, window_height - 40)
 
-    #display speed
-    glRasterPos2f(10, window_height - 40)
-    speed_text = f"Speed: {car_speed:.2f}"
-    for character in speed_text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(character))
+    #culling stats
+    if show_cull_stats:
+        stats_text = "Drawn: " + ", ".join(f"{name} {drawn}/{total}" for name, (drawn, total) in cull_stats.items())
+        hud.text("stats", stats_text, 10, window_height - 60, font="small")
+
+    #frame profile, one line per phase in the top right corner
+    if show_profile:
+        for i, line in enumerate(profile_lines):
+            hud.text(f"profile {i}", line, window_width - 330, window_height - 20 - 15 * i, font="small")
 
     #game over message
-    if game_over:
-        glColor3f(1.0, 0.0, 0.0)
-        glRasterPos2f(window_width / 2 - 50, window_height / 2 + 20)
-        game_over_text = "Game Over!"
-        for character in game_over_text:
-            glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(character))
-
-        #displayscore
-        glRasterPos2f(window_width / 2 - 50, window_height / 2)
-        score_message = f"You Scored {score}!"
-        for character in score_message:
-            glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(character))
-
-        #display restart
-        glRasterPos2f(window_width / 2 - 50, window_height / 2 - 20)
-        restart_message = "Press 'r' to restart"
-        for character in restart_message:
-            glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(character))
+    if state.game_over:
+        red = (1.0, 0.0, 0.0)
+        hud.text("game_over", "Game Over!", window_width / 2 - 50, window_height / 2 + 20, color=red)
+        hud.text("final_score", f"You Scored {state.score}!", window_width / 2 - 50, window_height / 2, color=red)
+        hud.text("restart", "Press 'r' to restart", window_width / 2 - 50, window_height / 2 - 20, color=red)
 
     # Display controls
-    glColor3f(1.0, 1.0, 1.0)
-    glRasterPos2f(10, 20)
-    controls_text = "Controls: W/S - Accelerate/Brake, A/D - Turn, V - Change View, Arrow Keys - Adjust Camera"
-    for character in controls_text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_12, ord(character))
+    controls_text = "Controls: W/S - Accelerate/Brake, A/D - Turn, V - Change View, Arrow Keys - Adjust Camera, C - Culling Stats, P - Profile"
+    hud.text("controls", controls_text, 10, 20, font="small")
+
+    hud.draw()
 
     glPopMatrix()
     glMatrixMode(GL_PROJECTION)
     glPopMatrix()
     glMatrixMode(GL_MODELVIEW)
 
-    glutSwapBuffers()
 
+def update_profile_lines():
+    """Refresh the profile overlay text from the profiler's rolling stats"""
+    global profile_lines
+
+    profile_lines = ["Phase                        avg ms    p99 ms"]
+    for name, (average, p99) in profiler.stats().items():
+        profile_lines.append(f"{name:<27}{average:>7.2f}{p99:>10.2f}")
+
+
+def report_startup():
+    """Print how long startup took, once the first frame is out"""
+    first_frame = time.perf_counter()
+    print(f"startup: imports {(imports_done - startup_time) * 1000:.1f} ms, "
+          f"init {(init_done - imports_done) * 1000:.1f} ms, "
+          f"first frame {(first_frame - init_done) * 1000:.1f} ms, "
+          f"total {(first_frame - startup_time) * 1000:.1f} ms", file=sys.stderr)
+
+
+def display():
+    if worker is not None:
+        render(worker.frame())
+    else:
+        render(interpolate_state(previous_motion, game, clock.alpha))
+    with profiler.phase("swap"):
+        glutSwapBuffers()
+
+    if show_timings and not profiler.frames:
+        report_startup()
+    profiler.end_frame()
+    if show_profile and profiler.frames % profile_refresh == 0:
+        update_profile_lines()
 
 
 def reshape(width, height):
@@ -666,22 +398,31 @@ def reshape(width, height):
 
 def keyboard(key, x, y):
     """Handle keyboard input"""
-    global car_rotation, car_speed, first_person_view, game_over, score
-    global move_forward, move_backward, turn_left, turn_right
+    global first_person_view, show_cull_stats, show_profile
 
-    if game_over and key == b'r':
-        restart_game()
+    if key == b'c':
+        show_cull_stats = not show_cull_stats
+
+    if key == b'p':
+        show_profile = not show_profile
+        update_profile_lines()
+
+    if game.game_over and key == b'r' and playback is None:
+        if worker is not None:
+            worker.request(restart)
+        else:
+            restart()
         return
 
-    if not game_over:
+    if not game.game_over:
         if key == b'w':
-            move_forward = True
+            inputs.move_forward = True
         elif key == b's':
-            move_backward = True
+            inputs.move_backward = True
         elif key == b'a':
-            turn_left = True
+            inputs.turn_left = True
         elif key == b'd':
-            turn_right = True
+            inputs.turn_right = True
         elif key == b'v':
             first_person_view = not first_person_view
 
@@ -689,16 +430,14 @@ def keyboard(key, x, y):
 
 
 def keyboard_up(key, x, y):
-    global move_forward, move_backward, turn_left, turn_right
-
     if key == b'w':
-        move_forward = False
+        inputs.move_forward = False
     elif key == b's':
-        move_backward = False
+        inputs.move_backward = False
     elif key == b'a':
-        turn_left = False
+        inputs.turn_left = False
     elif key == b'd':
-        turn_right = False
+        inputs.turn_right = False
 
 
 def special_keys(key, x, y):
@@ -724,99 +463,127 @@ def mouse(button, state, x, y):
         glutPostRedisplay()
 
 
-def update_cpu_cars():
-    global cpu_cars, score, game_over, cpu_spawn_timer, num_cars, cpu_spawn_interval
-
-    # Adjust CPU car spawn interval based on the score
-    if score < 5000:
-        cpu_spawn_interval = 350
-    elif score < 10000:
-        cpu_spawn_interval = 300
-    elif score < 15000:
-        cpu_spawn_interval = 250
-    else:
-        cpu_spawn_interval = 180
-
-    # Start with fewer CPU cars and increment slower
-    if score < 10000:
-        num_cars = 1 + (score // 5000)
-        if num_cars > 2:
-            num_cars = 2
-    else:
-        num_cars = 2
+def advance_game():
+    """Step the game one tick with the keyboard's or the replay's inputs; False once a replay is over"""
+    global previous_motion
 
-    cpu_spawn_timer += 1
-    if cpu_spawn_timer >= cpu_spawn_interval:
-        cpu_spawn_timer = 0
+    tick_input = inputs
+    if playback is not None:
+        bits = next(playback, None)
+        if bits is None:
+            return False
+        if bits & INPUT_RESTART:
+            restart()
+        tick_input = tick_inputs[bits & 15]
+    if recorder is not None:
+        recorder.record(tick_input)
 
-        lanes = [-road_width / 4, 0, road_width / 4]
+    previous_motion = capture_motion(game)
+    step(game, tick_input)
+    return True
 
-        for _ in range(num_cars):
-            car_spawned = False
-            while not car_spawned:
-                spawn_x = random.choice(lanes) + random.uniform(-1.0, 1.0)
-                spawn_z = car_z - 80
-                speed = 0.2 
-                color = (random.uniform(0.0, 1.0), random.uniform(0.0, 1.0), random.uniform(0.0, 1.0))
 
-                min_distance = 1.5
-                overlap = False
-                for car in cpu_cars:
-                    distance = math.sqrt((spawn_x - car.x) ** 2 + (spawn_z - car.z) ** 2)
-                    if distance < min_distance:
-                        overlap = True
-                        break
-
-                if not overlap:
-                    cpu_cars.append(CpuCar(spawn_x, spawn_z, speed, color))
-                    car_spawned = True
+def idle():
+    if worker is None:
+        ticks = clock.advance(glutGet(GLUT_ELAPSED_TIME))
+        for _ in range(ticks):
+            advance_game()
 
-    for car in cpu_cars:
-        car.z -= car.speed
+    glutPostRedisplay()
 
-        if car.z > car_z and not car.overtaken:
-            score += 100
-            car.overtaken = True
 
-        if car.z < car_z and abs(car.x - car_x) < 1.0 and abs(car.z - car_z) < 2.0:
-            game_over = True
+def render_offscreen(path, frames):
+    """Render frames ticks of the game without a window, streaming raw RGB frames to path ("-" for stdout)"""
+    import offscreen
 
-    cpu_cars = [c for c in cpu_cars if c.z > car_z - 150]
+    offscreen.create_context(window_width, window_height)
+    capture = offscreen.FrameCapture(window_width, window_height)
+    capture.bind()
+    glViewport(0, 0, window_width, window_height)
+    init()
 
+    output = sys.stdout.buffer if path == "-" else open(path, "wb")
+    try:
+        for _ in range(frames):
+            if not advance_game():
+                break
+            render(game)
+            with profiler.phase("swap"):
+                frame = capture.read()
+            if frame is not None:
+                output.write(frame)
+            if show_timings and not profiler.frames:
+                report_startup()
+            profiler.end_frame()
+        frame = capture.finish()
+        if frame is not None:
+            output.write(frame)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+        capture.release()
+
+
+def restart():
+    global previous_motion
+
+    restart_game(game)
+    previous_motion = None
+    if recorder is not None:
+        recorder.restart()
 
-def idle():
-    update_car()
-    update_cpu_cars()
-    glutPostRedisplay()
+    #resetting movements
+    inputs.move_forward = False
+    inputs.move_backward = False
+    inputs.turn_left = False
+    inputs.turn_right = False
 
 
-def restart_game():
-    global car_x, car_y, car_z, car_rotation, car_speed, game_over, score
-    global move_forward, move_backward, turn_left, turn_right
-    global cpu_spawn_timer
+def main():
+    global game, recorder, playback, show_timings, use_shaders, worker
+
+    parser = argument_parser()
+    args = parser.parse_args()
+    if args.threaded and args.offscreen:
+        parser.error("--threaded only applies to playing in a window")
+    # Replays store the seed as an unsigned 64 bit number
+    if args.seed is not None and not 0 <= args.seed < 2 ** 64:
+        parser.error("--seed must be between 0 and 2**64 - 1")
+    show_timings = args.timings
+    use_shaders = args.shaders
+
+    # The profiler's phase stack belongs to the render thread
+    if not args.threaded:
+        profiler.instrument(simulation, simulation_phases)
+    if args.profile_log:
+        profiler.open_log(args.profile_log)
+
+    if args.replay:
+        replay = Replay.load(args.replay)
+        game = new_game(replay.seed)
+        playback = iter(replay.ticks)
+    else:
+        game = new_game(args.seed)
+    if args.record:
+        recorder = Recorder(game.seed)
 
-    car_x = 0.0
-    car_y = 0.0
-    car_z = 0.0
-    car_rotation = 0.0
-    car_speed = 0.0
-    game_over = False
-    score = 0
+    if args.threaded:
+        worker = SimulationWorker(advance_game, game, tick_rate, max_substeps)
 
-    cpu_spawn_timer = 0
+    if args.offscreen:
+        render_offscreen(args.offscreen, args.frames)
+    else:
+        run_window()
+    if worker is not None:
+        worker.stop()
 
-    #resetting movements
-    move_forward = False
-    move_backward = False
-    turn_left = False
-    turn_right = False
+    if recorder is not None:
+        recorder.replay(game).save(args.record)
 
-    #road environment
-    generate_road_segments()
-    generate_environment_objects()
 
+def run_window():
+    """Play in a GLUT window until it is closed"""
 
-def main():
     glutInit()
     glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGB | GLUT_DEPTH)
     glutInitWindowSize(window_width, window_height)
@@ -829,11 +596,12 @@ def main():
     glutSpecialFunc(special_keys)
     glutMouseFunc(mouse)
     glutIdleFunc(idle)
+    # Return from the main loop when the window closes, so a recording can be saved
+    glutSetOption(GLUT_ACTION_ON_WINDOW_CLOSE, GLUT_ACTION_GLUTMAINLOOP_RETURNS)
 
     init()
-    generate_road_segments()
-    generate_environment_objects()
-    restart_game()
+    if worker is not None:
+        worker.start()
 
     glutMainLoop()
 
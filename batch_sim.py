@@ -0,0 +1,237 @@
+"""Vectorized simulation of many independent games at once.
+
+BatchSimulation keeps K games as NumPy arrays and advances all of them with one
+call to step(). It follows the same rules as simulation.step(): traffic first
+(spawn schedule, driving.py's car-following and lane changes, swept rear-end
+crashes, overtakes), then the player car (speed, steering, road edges, swept
+collisions, road streaming). Scenery is left out because it never affects the
+outcome of a game.
+
+Each game can hold up to max_cpu_cars traffic cars. simulation.step() has no
+such cap, so a spawn that would go over it is skipped and that game stops
+playing out as the single game would. Traffic leaves once it is traffic_range
+from the player, ahead or behind, so at the game's spawn rates a road holds a
+few cars and the default of 16 is only reached by traffic queued up behind the
+player (a crashed or stopped car, say). Raise max_cpu_cars if a policy does
+that on purpose.
+"""
+import numpy as np
+
+from collision import candidates, collide, player_boxes, player_reach, rear_end_box
+from driving import drive
+from simulation import (
+    GameState, INPUT_FORWARD, INPUT_BACKWARD, INPUT_LEFT, INPUT_RIGHT, generate_environment_objects,
+    max_speed, acceleration, deceleration, turning_speed, max_turn_angle, wheel_offset,
+    road_width, road_segment_length, num_road_segments, spawn_speed, min_desired_speed, max_desired_speed,
+    max_spawn_attempts, traffic_range,
+)
+
+
+class BatchSimulation:
+    def __init__(self, num_games, max_cpu_cars=16, seed=None):
+        self.num_games = num_games
+        self.max_cpu_cars = max_cpu_cars
+        self.rng = np.random.default_rng(seed)
+
+        shape = (num_games,)
+        self.car_x = np.zeros(shape)
+        self.car_z = np.zeros(shape)
+        self.car_rotation = np.zeros(shape)
+        self.car_speed = np.zeros(shape)
+        self.game_over = np.zeros(shape, dtype=bool)
+        self.score = np.zeros(shape, dtype=np.int64)
+        self.furthest_segment = np.zeros(shape)
+
+        self.cpu_spawn_timer = np.zeros(shape, dtype=np.int64)
+        self.cpu_spawn_interval = np.full(shape, 350, dtype=np.int64)
+        self.num_cars = np.ones(shape, dtype=np.int64)
+
+        cars = (num_games, max_cpu_cars)
+        self.cpu_x = np.zeros(cars)
+        self.cpu_z = np.zeros(cars)
+        self.cpu_speed = np.zeros(cars)
+        self.cpu_target_x = np.zeros(cars)
+        self.cpu_desired_speed = np.zeros(cars)
+        self.cpu_color = np.zeros(cars + (3,))
+        self.cpu_overtaken = np.zeros(cars, dtype=bool)
+        self.cpu_alive = np.zeros(cars, dtype=bool)
+
+        self.reset()
+
+    def reset(self, mask=None):
+        """Restart every game, or only the games selected by a boolean mask"""
+        if mask is None:
+            mask = np.ones(self.num_games, dtype=bool)
+
+        self.car_x[mask] = 0.0
+        self.car_z[mask] = 0.0
+        self.car_rotation[mask] = 0.0
+        self.car_speed[mask] = 0.0
+        self.game_over[mask] = False
+        self.score[mask] = 0
+        self.furthest_segment[mask] = -(num_road_segments - 1) * road_segment_length
+        self.cpu_spawn_timer[mask] = 0
+        self.cpu_alive[mask] = False
+        self.cpu_speed[mask] = 0.0
+
+    def step(self, actions):
+        """Advance every game one tick. actions holds one INPUT_* bitmask per game."""
+        actions = np.asarray(actions)
+        self.update_cpu_cars()
+        self.update_car(actions)
+
+    def update_cpu_cars(self):
+        score = self.score
+        self.cpu_spawn_interval = np.select(
+            [score < 5000, score < 10000, score < 15000], [350, 300, 250], 180)
+        self.num_cars = np.where(score < 10000, np.minimum(1 + score // 5000, 2), 2)
+
+        self.cpu_spawn_timer += 1
+        spawning = self.cpu_spawn_timer >= self.cpu_spawn_interval
+        self.cpu_spawn_timer[spawning] = 0
+
+        for slot in range(2):
+            games = np.flatnonzero(spawning & (self.num_cars > slot))
+            if games.size:
+                self.spawn_cars(games)
+
+        # Every game's traffic drives in one call, each game's player car as its obstacle
+        alive = self.cpu_alive
+        games = np.nonzero(alive)[0]
+        columns = [self.cpu_x, self.cpu_z, self.cpu_speed, self.cpu_target_x, self.cpu_desired_speed]
+        cars = [column[alive] for column in columns]
+        start_x = cars[0].copy()
+        start_z = cars[1].copy()
+        forward_speed = self.car_speed * np.cos(np.radians(self.car_rotation))
+        drive(*cars, games, self.car_x, self.car_z, forward_speed)
+        for column, values in zip(columns, cars):
+            column[alive] = values
+
+        # Rear-end crashes anywhere along the traffic's move
+        game, car = candidates(games, start_z, cars[1], self.car_z, self.car_z, rear_end_box)
+        hit = collide(game, car, start_x, start_z, cars[0], cars[1],
+                      self.car_x, self.car_z, self.car_x, self.car_z, rear_end_box)
+        self.game_over[game[hit]] = True
+
+        dz = self.cpu_z - self.car_z[:, None]
+        overtaking = alive & (dz > 0) & ~self.cpu_overtaken
+        self.score += 100 * overtaking.sum(axis=1)
+        self.cpu_overtaken |= overtaking
+
+        left = alive & (np.abs(dz) >= traffic_range)
+        self.cpu_alive &= ~left
+        self.cpu_speed[left] = 0.0
+
+    def spawn_cars(self, games):
+        """Add one CPU car to each of the given games, retrying spawn spots that overlap"""
+        lanes = np.array([-road_width / 4, 0, road_width / 4])
+        free = ~self.cpu_alive[games]
+        has_room = free.any(axis=1)
+        games = games[has_room]
+        slots = free[has_room].argmax(axis=1)
+
+        for _ in range(max_spawn_attempts):
+            if not games.size:
+                break
+            count = games.size
+            spawn_x = lanes[self.rng.integers(0, 3, count)] + self.rng.uniform(-1.0, 1.0, count)
+            spawn_z = self.car_z[games] - 80
+            color = self.rng.uniform(0.0, 1.0, (count, 3))
+            desired_speed = self.rng.uniform(min_desired_speed, max_desired_speed, count)
+
+            distance = np.hypot(spawn_x[:, None] - self.cpu_x[games], spawn_z[:, None] - self.cpu_z[games])
+            overlap = (self.cpu_alive[games] & (distance < 1.5)).any(axis=1)
+
+            placed = ~overlap
+            g = games[placed]
+            s = slots[placed]
+            self.cpu_x[g, s] = spawn_x[placed]
+            self.cpu_z[g, s] = spawn_z[placed]
+            self.cpu_speed[g, s] = spawn_speed
+            self.cpu_target_x[g, s] = spawn_x[placed]
+            self.cpu_desired_speed[g, s] = desired_speed[placed]
+            self.cpu_color[g, s] = color[placed]
+            self.cpu_overtaken[g, s] = False
+            self.cpu_alive[g, s] = True
+
+            games = games[overlap]
+            slots = slots[overlap]
+
+    def update_car(self, actions):
+        active = ~self.game_over
+        forward = (actions & INPUT_FORWARD) != 0
+        backward = (actions & INPUT_BACKWARD) != 0
+        left = (actions & INPUT_LEFT) != 0
+        right = (actions & INPUT_RIGHT) != 0
+
+        angle_rad = np.radians(self.car_rotation)
+
+        #car movement logics
+        speed = self.car_speed
+        braking = np.maximum(speed - acceleration, 0.0)
+        coasting = np.where(speed > 0, np.maximum(speed - deceleration, 0.0), 0.0)
+        speed = np.where(forward, np.minimum(speed + acceleration, max_speed),
+                         np.where(backward, np.where(speed > 0, braking, speed), coasting))
+
+        turn = turning_speed * (np.abs(speed) / max_speed)
+        steering = np.abs(speed) > 0.05
+        rotation = self.car_rotation
+        rotation = np.where(steering & left, np.minimum(rotation + turn, max_turn_angle), rotation)
+        rotation = np.where(steering & right, np.maximum(rotation - turn, -max_turn_angle), rotation)
+
+        #carmovement
+        start_x = self.car_x
+        start_z = self.car_z
+        car_x = self.car_x + speed * np.sin(-angle_rad)
+        car_z = self.car_z - speed * np.cos(-angle_rad)
+
+        self.car_speed = np.where(active, speed, self.car_speed)
+        self.car_rotation = np.where(active, rotation, self.car_rotation)
+        self.car_x = np.where(active, car_x, self.car_x)
+        self.car_z = np.where(active, car_z, self.car_z)
+
+        off_road = ((np.abs(self.car_x - wheel_offset) > road_width / 2)
+                    | (np.abs(self.car_x + wheel_offset) > road_width / 2))
+
+        # Running into a CPU car or lining the wheels up with one anywhere along
+        # the player's move, as in update_car()
+        alive = self.cpu_alive
+        x = self.cpu_x[alive]
+        z = self.cpu_z[alive]
+        game, car = candidates(np.nonzero(alive)[0], z, z, start_z, self.car_z, player_reach)
+        collided = np.zeros(self.num_games, dtype=bool)
+        for box in player_boxes:
+            hit = collide(game, car, x, z, x, z, start_x, start_z, self.car_x, self.car_z, box)
+            collided[game[hit]] = True
+
+        self.game_over |= active & (off_road | collided)
+
+        #road streaming
+        extend = active & (self.car_z < self.furthest_segment + (num_road_segments - 5) * road_segment_length)
+        self.furthest_segment[extend] -= road_segment_length
+        self.score += extend
+
+    def game_state(self, index):
+        """Copy one game out of the batch as a GameState, e.g. to render or inspect it"""
+        state = GameState()
+        state.car_x = float(self.car_x[index])
+        state.car_z = float(self.car_z[index])
+        state.car_rotation = float(self.car_rotation[index])
+        state.car_speed = float(self.car_speed[index])
+        state.game_over = bool(self.game_over[index])
+        state.score = int(self.score[index])
+        state.cpu_spawn_timer = int(self.cpu_spawn_timer[index])
+        state.cpu_spawn_interval = int(self.cpu_spawn_interval[index])
+        state.num_cars = int(self.num_cars[index])
+
+        furthest = float(self.furthest_segment[index])
+        state.road_segments = [furthest + (num_road_segments - 1 - i) * road_segment_length
+                               for i in range(num_road_segments)]
+        # The batch doesn't simulate scenery; generate what surrounds the car
+        generate_environment_objects(state)
+
+        for slot in np.flatnonzero(self.cpu_alive[index]):
+            state.cpu_cars.append(self.cpu_x[index, slot], self.cpu_z[index, slot], self.cpu_speed[index, slot],
+                                  self.cpu_color[index, slot], self.cpu_overtaken[index, slot],
+                                  self.cpu_target_x[index, slot], self.cpu_desired_speed[index, slot])
+        return state
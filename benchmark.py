@@ -0,0 +1,229 @@
+"""Reproducible performance scenarios for the simulation and the renderer.
+
+Each scenario has a fixed seed, so the same scenery and traffic come up
+every run, and drives the car with a fixed policy. A crash restarts the game
+the way the 'r' key does (and reapplies the scenario's setup), so a scenario
+keeps driving for its whole length.
+
+    python benchmark.py                        # simulation ticks per second
+    python benchmark.py --render               # also frames per second, offscreen
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+
+--compare prints each result against the baseline and exits with status 1 if
+any of them got slower by more than --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+import simulation
+from simulation import Inputs, new_game, restart_game, step
+
+warmup_ticks = 600
+benchmark_ticks = 6000
+benchmark_frames = 300
+
+# Cars queued behind the player by rush_hour
+rush_hour_cars = 3000
+
+
+def cruise(state, tick):
+    """Hold the car around a quarter of its top speed"""
+    return Inputs(move_forward=state.car_speed < simulation.max_speed / 4)
+
+
+def full_throttle(state, tick):
+    return Inputs(move_forward=True)
+
+
+def weave(state, tick):
+    """Full throttle, steering across the lanes and back every few seconds"""
+    target_x = simulation.road_width / 4 * math.sin(tick / 180)
+    # Negative rotation moves the car towards +x
+    target_rotation = max(-15.0, min(15.0, (state.car_x - target_x) * 10))
+    return Inputs(move_forward=True,
+                  turn_left=state.car_rotation < target_rotation - 1,
+                  turn_right=state.car_rotation > target_rotation + 1)
+
+
+def dense_traffic(state):
+    # The shortest spawn interval and two cars per spawn start at 15000 points
+    state.score = 15000
+
+
+def rush_hour(state):
+    """rush_hour_cars cars already on the road behind the player, in all three lanes"""
+    rng = random.Random(state.seed)
+    traffic = state.cpu_cars
+    traffic.clear()
+    for i in range(rush_hour_cars):
+        x = (i % 3 - 1) * simulation.road_width / 4 + rng.uniform(-1.0, 1.0)
+        z = state.car_z + 10 + (i // 3) * 6.0
+        color = (rng.random(), rng.random(), rng.random())
+        desired_speed = rng.uniform(simulation.min_desired_speed, simulation.max_desired_speed)
+        traffic.append(x, z, simulation.spawn_speed, color, overtaken=True, desired_speed=desired_speed)
+    state.traffic_index.rebuild(traffic)
+
+
+# Name: (seed, policy, setup applied to the new game)
+scenarios = {
+    "idle_cruise": (1, cruise, None),
+    "max_speed_straight": (2, full_throttle, None),
+    "dense_traffic": (3, cruise, dense_traffic),
+    "weaving": (4, weave, None),
+    "rush_hour": (5, cruise, rush_hour),
+}
+
+# simulation.py settings a scenario changes for its own runs
+settings = {
+    # The queue reaches far further back than traffic_range
+    "rush_hour": {"traffic_range": math.inf},
+}
+
+
+@contextlib.contextmanager
+def configured(name):
+    """The scenario's settings in place, and the usual ones back afterwards"""
+    changed = settings.get(name, {})
+    saved = {key: getattr(simulation, key) for key in changed}
+    for key, value in changed.items():
+        setattr(simulation, key, value)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            setattr(simulation, key, value)
+
+
+def start(name):
+    """A new game for the scenario, advanced past its warmup"""
+    seed, policy, setup = scenarios[name]
+    state = new_game(seed)
+    state.crashes = 0
+    if setup is not None:
+        setup(state)
+    for tick in range(warmup_ticks):
+        advance(state, policy, setup, tick)
+    return state, policy, setup
+
+
+def advance(state, policy, setup, tick):
+    step(state, policy(state, tick))
+    if state.game_over:
+        state.crashes += 1
+        restart_game(state)
+        if setup is not None:
+            setup(state)
+
+
+def run_simulation(name, ticks=benchmark_ticks):
+    state, policy, setup = start(name)
+    begin = time.perf_counter()
+    for tick in range(warmup_ticks, warmup_ticks + ticks):
+        advance(state, policy, setup, tick)
+    elapsed = time.perf_counter() - begin
+    return {
+        "ticks_per_second": ticks / elapsed,
+        "score": state.score,
+        "cars": len(state.cpu_cars),
+        "crashes": state.crashes,
+    }
+
+
+def run_render(name, frames=benchmark_frames):
+    """Frames per second of HighwayTraffic.render with one tick per frame"""
+    import HighwayTraffic
+    from OpenGL.GL import glFinish
+
+    state, policy, setup = start(name)
+    render = HighwayTraffic.render
+    tick = warmup_ticks
+    for _ in range(10):
+        advance(state, policy, setup, tick)
+        tick += 1
+        render(state)
+    glFinish()
+
+    begin = time.perf_counter()
+    for _ in range(frames):
+        advance(state, policy, setup, tick)
+        tick += 1
+        render(state)
+    glFinish()
+    elapsed = time.perf_counter() - begin
+    return {"frames_per_second": frames / elapsed}
+
+
+def run(names, render=False, repeat=3, shaders=False):
+    """Best of repeat runs of every named scenario"""
+    if render:
+        import offscreen
+        offscreen.create_context(800, 600)
+        import HighwayTraffic
+        HighwayTraffic.use_shaders = shaders
+        HighwayTraffic.init()
+
+    results = {}
+    for name in names:
+        with configured(name):
+            runs = [run_simulation(name) for _ in range(repeat)]
+            result = max(runs, key=lambda r: r["ticks_per_second"])
+            if render:
+                result.update(max((run_render(name) for _ in range(repeat)), key=lambda r: r["frames_per_second"]))
+        results[name] = result
+        print(name, " ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                             for key, value in result.items()))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print results against the baseline; return False if a rate dropped by more than tolerance"""
+    passed = True
+    for name, result in results.items():
+        for key in ("ticks_per_second", "frames_per_second"):
+            if key not in result or key not in baseline.get(name, {}):
+                continue
+            ratio = result[key] / baseline[name][key]
+            slower = ratio < 1 - tolerance
+            passed = passed and not slower
+            print(f"{name} {key}: {baseline[name][key]:.1f} -> {result[key]:.1f} ({ratio:.2f}x)"
+                  + (" REGRESSION" if slower else ""))
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run (default all): " + ", ".join(scenarios))
+    parser.add_argument("--render", action="store_true", help="also measure frames per second in an offscreen context")
+    parser.add_argument("--shaders", action="store_true", help="render with the GLSL pipeline")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; the best one counts")
+    parser.add_argument("--output", metavar="JSON", help="write the results here")
+    parser.add_argument("--compare", metavar="JSON", help="compare the results with this earlier output")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="slowdown allowed by --compare")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in scenarios:
+            parser.error(f"unknown scenario {name}")
+
+    results = run(args.scenarios or list(scenarios), args.render, args.repeat, args.shaders)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "scenarios": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["scenarios"]
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Gym-style environment around the headless simulation.
+
+HighwayEnv plays one game through reset() and step(action). An action is an
+INPUT_* bitmask (0-15) from simulation.py, the reward is the change in score
+and an episode ends on game_over.
+
+Observations are flat float32 arrays:
+    car_x, car_speed, car_rotation / max_turn_angle,
+    distance from the left wheel to the left border,
+    distance from the right wheel to the right border,
+    then (dx, dz, speed) for the nearest_cars CPU cars closest along z,
+    padded with (0, far_distance, 0) when there are fewer cars.
+
+VectorHighwayEnv runs many environments in a pool of worker processes. Actions
+go in and observations, rewards and done flags come back through shared memory,
+so a step only sends one short command per worker down a pipe.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from simulation import Inputs, new_game, step, max_turn_angle, road_width, wheel_offset
+
+nearest_cars = 4
+far_distance = 150.0
+observation_size = 5 + 3 * nearest_cars
+
+
+class HighwayEnv:
+    def __init__(self, max_steps=None):
+        self.max_steps = max_steps
+        self.state = None
+        self.steps = 0
+
+    def reset(self, seed=None):
+        self.state = new_game(seed)
+        self.steps = 0
+        return self.observe()
+
+    def step(self, action):
+        state = self.state
+        score = state.score
+        step(state, Inputs.from_bits(int(action)))
+        self.steps += 1
+
+        reward = float(state.score - score)
+        done = state.game_over or (self.max_steps is not None and self.steps >= self.max_steps)
+        info = {"score": state.score, "game_over": state.game_over}
+        return self.observe(), reward, done, info
+
+    def observe(self, out=None):
+        """Write the observation for the current state into out (or a new array)"""
+        if out is None:
+            out = np.empty(observation_size, dtype=np.float32)
+        state = self.state
+
+        out[0] = state.car_x
+        out[1] = state.car_speed
+        out[2] = state.car_rotation / max_turn_angle
+        out[3] = (state.car_x - wheel_offset) + road_width / 2
+        out[4] = road_width / 2 - (state.car_x + wheel_offset)
+
+        traffic = state.cpu_cars
+        count = traffic.count
+        dz = traffic.z[:count] - state.car_z
+        nearest = np.argsort(np.abs(dz), kind="stable")[:nearest_cars]
+        nearby = out[5:].reshape(nearest_cars, 3)
+        nearby[:] = (0.0, far_distance, 0.0)
+        found = len(nearest)
+        nearby[:found, 0] = traffic.x[nearest] - state.car_x
+        nearby[:found, 1] = dz[nearest]
+        nearby[:found, 2] = traffic.speed[nearest]
+        return out
+
+
+def _worker(pipe, first, count, max_steps, names):
+    """Run envs [first, first + count) of a VectorHighwayEnv, reading and writing its shared arrays"""
+    buffers = [shared_memory.SharedMemory(name=name) for name in names]
+    num_envs = first + count
+    obs, rewards, dones, scores, actions = _shared_arrays(buffers, num_envs)
+    envs = [HighwayEnv(max_steps) for _ in range(count)]
+
+    try:
+        while True:
+            command, seed = pipe.recv()
+            if command == "step":
+                for i, env in enumerate(envs):
+                    j = first + i
+                    _, rewards[j], dones[j], info = env.step(actions[j])
+                    if dones[j]:
+                        scores[j] = info["score"]
+                        env.reset()
+                    env.observe(obs[j])
+            elif command == "reset":
+                for i, env in enumerate(envs):
+                    j = first + i
+                    env.reset(None if seed is None else seed + j)
+                    env.observe(obs[j])
+                    rewards[j] = 0.0
+                    dones[j] = False
+            elif command == "close":
+                break
+            pipe.send(None)
+    finally:
+        del obs, rewards, dones, scores, actions
+        for buffer in buffers:
+            buffer.close()
+
+
+def _shared_arrays(buffers, num_envs):
+    obs = np.ndarray((num_envs, observation_size), dtype=np.float32, buffer=buffers[0].buf)
+    rewards = np.ndarray((num_envs,), dtype=np.float32, buffer=buffers[1].buf)
+    dones = np.ndarray((num_envs,), dtype=bool, buffer=buffers[2].buf)
+    scores = np.ndarray((num_envs,), dtype=np.int64, buffer=buffers[3].buf)
+    actions = np.ndarray((num_envs,), dtype=np.int8, buffer=buffers[4].buf)
+    return obs, rewards, dones, scores, actions
+
+
+class VectorHighwayEnv:
+    """num_envs HighwayEnvs spread over a multiprocessing worker pool.
+
+    Finished episodes are reset inside the worker; their final score is left in
+    scores until the next episode of that env ends.
+    """
+    def __init__(self, num_envs, num_workers=None, max_steps=None):
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        num_workers = max(1, min(num_workers, num_envs))
+        self.num_envs = num_envs
+
+        sizes = [num_envs * observation_size * 4, num_envs * 4, num_envs, num_envs * 8, num_envs]
+        self.buffers = [shared_memory.SharedMemory(create=True, size=size) for size in sizes]
+        self.obs, self.rewards, self.dones, self.scores, self.actions = _shared_arrays(self.buffers, num_envs)
+        names = [buffer.name for buffer in self.buffers]
+
+        self.pipes = []
+        self.workers = []
+        per_worker, extra = divmod(num_envs, num_workers)
+        first = 0
+        for w in range(num_workers):
+            count = per_worker + (1 if w < extra else 0)
+            parent, child = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_worker, args=(child, first, count, max_steps, names), daemon=True)
+            worker.start()
+            child.close()
+            self.pipes.append(parent)
+            self.workers.append(worker)
+            first += count
+
+    def _run(self, command, seed=None):
+        for pipe in self.pipes:
+            pipe.send((command, seed))
+        for pipe in self.pipes:
+            pipe.recv()
+
+    def reset(self, seed=None):
+        """Reset every env; env i is seeded with seed + i when a seed is given"""
+        self._run("reset", seed)
+        return self.obs.copy()
+
+    def step(self, actions):
+        self.actions[:] = actions
+        self._run("step")
+        return self.obs.copy(), self.rewards.copy(), self.dones.copy(), {"scores": self.scores.copy()}
+
+    def close(self):
+        for pipe in self.pipes:
+            pipe.send(("close", None))
+        for worker in self.workers:
+            worker.join()
+        for pipe in self.pipes:
+            pipe.close()
+        del self.obs, self.rewards, self.dones, self.scores, self.actions
+        for buffer in self.buffers:
+            buffer.close()
+            buffer.unlink()
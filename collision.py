@@ -0,0 +1,146 @@
+"""Swept collision tests between the player cars and the traffic.
+
+A box check at the end of a tick misses two cars whose motion relative to each
+other over the tick is longer than the box: one jumps from in front of the
+other to behind it. Here every car moves in a straight line from where it
+started the tick to where it ended it, and a crash is any moment of that
+motion at which a traffic car is inside the player car's collision box. The
+test is exact however far the cars move in a tick, so raising the speeds or
+stepping coarser ticks cannot make cars tunnel through each other.
+
+The exact test only runs on candidates from a sort-and-sweep along z: every
+path covers an interval of z, the traffic's intervals are sorted by (road,
+start), and each player car takes the run of intervals that can reach its own.
+A single game already keeps its traffic sorted by z (spatial.TrafficIndex), so
+it looks its candidates up there with window() instead, and tests the few it
+finds one at a time with collide_one().
+
+Boxes are (min_x, max_x, min_z, max_z) of the traffic car's position relative
+to the player car's, open on every side like the checks they replace. The
+traffic's move is checked against the rear-end box, and the player's move
+against the rear-end box and the wheel box, so a crash is caught whichever car
+closes the distance.
+"""
+import numpy as np
+
+# A car up to 2 ahead of the player and less than 1 to either side (the rear-end check)
+rear_end_box = (-1.0, 1.0, -2.0, 0.0)
+# Cars whose wheels line up within 0.2 and are less than 1 apart along the road
+wheel_box = (-0.2, 0.2, -1.0, 1.0)
+# The player car's own move is checked against both
+player_boxes = (rear_end_box, wheel_box)
+
+no_pairs = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+
+def swept_hit(start_x, start_z, move_x, move_z, box):
+    """Whether a point starting at (start_x, start_z) and moving by (move_x,
+    move_z) is inside box at any moment of the move, for arrays of points"""
+    enter = np.zeros(np.shape(start_x))
+    leave = np.ones(np.shape(start_x))
+    for start, move, low, high in ((start_x, move_x, box[0], box[1]), (start_z, move_z, box[2], box[3])):
+        # The span of the move during which the point is between low and high
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_low = (low - start) / move
+            t_high = (high - start) / move
+        still = move == 0
+        inside = (start > low) & (start < high)
+        enter = np.maximum(enter, np.where(still, np.where(inside, -np.inf, np.inf), np.minimum(t_low, t_high)))
+        leave = np.minimum(leave, np.where(still, np.where(inside, np.inf, -np.inf), np.maximum(t_low, t_high)))
+    return enter < leave
+
+
+def sweep(group, low, high, query_group, query_low, query_high):
+    """(query, item) index pairs of a query interval and an item interval in the
+    same group that overlap along z"""
+    if not len(low) or not len(query_low):
+        return no_pairs
+
+    # One sort key for every group's items, groups one after another
+    base = min(low.min(), query_low.min())
+    span = max(high.max(), query_high.max()) - base + 1.0
+    key = group * span + (low - base)
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+
+    # The items a query can overlap start before it ends, and no earlier than
+    # the longest item could start and still reach it
+    longest = (high - low).max()
+    first = sorted_key.searchsorted(query_group * span + np.maximum(query_low - base - longest, 0.0))
+    last = sorted_key.searchsorted(query_group * span + (query_high - base))
+    counts = last - first
+    total = int(counts.sum())
+    if not total:
+        return no_pairs
+
+    query = np.repeat(np.arange(len(query_low)), counts)
+    position = np.arange(total) - np.repeat(np.cumsum(counts) - counts - first, counts)
+    item = order[position]
+    overlapping = high[item] > query_low[query]
+    return query[overlapping], item[overlapping]
+
+
+def candidates(group, start_z, end_z, car_start_z, car_end_z, box):
+    """(player car, traffic car) index pairs that may collide, from the sweep
+    of the traffic's paths along z against the stretch each player car's box
+    covers; group gives each traffic car's player car"""
+    low = np.minimum(start_z, end_z)
+    high = np.maximum(start_z, end_z)
+    car_low = np.minimum(car_start_z, car_end_z) + box[2]
+    car_high = np.maximum(car_start_z, car_end_z) + box[3]
+    return sweep(group, low, high, np.arange(len(car_start_z)), car_low, car_high)
+
+
+def enclosing(boxes):
+    """The smallest box holding every one of boxes, to look up the candidates for all of them at once"""
+    return (min(box[0] for box in boxes), max(box[1] for box in boxes),
+            min(box[2] for box in boxes), max(box[3] for box in boxes))
+
+
+player_reach = enclosing(player_boxes)
+
+
+def window(car_start_z, car_end_z, box, longest=0.0):
+    """(z, reach) for TrafficIndex.near() of where a traffic car moving at most
+    longest along z has to start to meet a single player car's box"""
+    low = min(car_start_z, car_end_z) + box[2] - longest
+    high = max(car_start_z, car_end_z) + box[3] + longest
+    return (low + high) / 2, (high - low) / 2
+
+
+def collide(car, item, start_x, start_z, end_x, end_z, car_start_x, car_start_z, car_end_x, car_end_z, box):
+    """Which (player car, traffic car) pairs meet: the traffic car is inside the
+    player car's box at some moment of both cars' moves from start to end"""
+    # Relative to the player car, which the box moves with
+    car_move_x = car_end_x[car] - car_start_x[car]
+    car_move_z = car_end_z[car] - car_start_z[car]
+    return swept_hit(start_x[item] - car_start_x[car], start_z[item] - car_start_z[car],
+                     end_x[item] - start_x[item] - car_move_x, end_z[item] - start_z[item] - car_move_z, box)
+
+
+def swept_hit_one(start_x, start_z, move_x, move_z, box):
+    """swept_hit() for one point, in plain Python: a single game only ever
+    tests a few cars, where NumPy's cost per call outweighs the work"""
+    enter = 0.0
+    leave = 1.0
+    # Along z first, where most cars are nowhere near
+    for start, move, low, high in ((start_z, move_z, box[2], box[3]), (start_x, move_x, box[0], box[1])):
+        if move == 0:
+            if not low < start < high:
+                return False
+            continue
+        t_low = (low - start) / move
+        t_high = (high - start) / move
+        if t_low > t_high:
+            t_low, t_high = t_high, t_low
+        enter = t_low if t_low > enter else enter
+        leave = t_high if t_high < leave else leave
+        if not enter < leave:
+            return False
+    return True
+
+
+def collide_one(start_x, start_z, end_x, end_z, car_start_x, car_start_z, car_end_x, car_end_z, box):
+    """collide() for one traffic car and one player car, given their positions as floats"""
+    return swept_hit_one(start_x - car_start_x, start_z - car_start_z,
+                         end_x - start_x - (car_end_x - car_start_x), end_z - start_z - (car_end_z - car_start_z), box)
@@ -0,0 +1,62 @@
+"""View-frustum tests for scene objects.
+
+A Frustum is built from the camera's field of view, clip planes and look-at
+points, keeps the projection and view matrices gluPerspective and gluLookAt
+would make from them, and tests bounding spheres against its six planes.
+Everything is NumPy, so whole arrays of objects are tested at once and no GL
+state is needed.
+"""
+import math
+
+import numpy as np
+
+
+def perspective(fovy, aspect, near, far):
+    """The matrix gluPerspective multiplies onto the projection stack"""
+    f = 1.0 / math.tan(math.radians(fovy) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ])
+
+
+def look_at(eye, center, up):
+    """The matrix gluLookAt multiplies onto the modelview stack"""
+    eye = np.asarray(eye, dtype=float)
+    forward = np.asarray(center, dtype=float) - eye
+    forward /= np.linalg.norm(forward)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+    upward = np.cross(side, forward)
+    m = np.identity(4)
+    m[0, :3] = side
+    m[1, :3] = upward
+    m[2, :3] = -forward
+    m[:3, 3] = -m[:3, :3] @ eye
+    return m
+
+
+class Frustum:
+    def __init__(self, fovy, aspect, near, far, eye, center, up):
+        self.eye = np.asarray(eye, dtype=float)
+        self.projection = perspective(fovy, aspect, near, far)
+        self.view = look_at(eye, center, up)
+        clip = self.projection @ self.view
+        planes = np.array([
+            clip[3] + clip[0], clip[3] - clip[0],  # left, right
+            clip[3] + clip[1], clip[3] - clip[1],  # bottom, top
+            clip[3] + clip[2], clip[3] - clip[2],  # near, far
+        ])
+        self.planes = planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+    def spheres_visible(self, centers, radii):
+        """Boolean mask of the spheres that are at least partly inside the frustum"""
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        distances = centers @ self.planes[:, :3].T + self.planes[:, 3]
+        return np.all(distances > -np.reshape(radii, (-1, 1)), axis=1)
+
+    def distances(self, x, z):
+        """Ground distance from the eye to each (x, z)"""
+        return np.hypot(np.asarray(x) - self.eye[0], np.asarray(z) - self.eye[2])
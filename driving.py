@@ -0,0 +1,292 @@
+"""Car-following and lane changes for the CPU traffic, vectorized over every car.
+
+Cars drive towards -z in the three lanes of the road. Every tick they are
+sorted by (road, lane, z) with one argsort, so the car each one follows is
+simply its neighbour in that order, and the leader and follower it would have
+in the lane beside it come from one binary search. Everything else is NumPy
+over all cars at once, so a tick costs O(n log n) however dense the traffic.
+
+Speeds follow the intelligent driver model (IDM): a car accelerates towards
+its own desired speed and brakes to keep a time gap to the car ahead. A car
+moves over a lane when that lets it accelerate clearly harder than it can
+behind its current leader, and the car it would pull in front of would not
+have to brake hard (the incentive and safety rules of MOBIL, without
+politeness). A lane change only picks a new target_x; the car then slides
+across at lateral_speed and makes no other change until it gets there.
+
+The player cars are obstacles in their lanes: traffic follows them and keeps
+out of their way, but they are moved by the simulation, not here. All
+distances are in world units and all times in ticks.
+
+NumPy's cost per call outweighs the work when a road holds only a handful of
+cars, as the ordinary game does, so up to few_cars cars take a plain Python
+copy of the same steps instead (drive_lists(), which simulation.py calls on
+lists it already holds). It rounds exactly as the arrays do, so a game plays
+out the same either way (and the same as in batch_sim.py).
+"""
+import bisect
+import math
+
+import numpy as np
+
+# The three lanes of simulation.py's road, road_width / 4 apart
+lane_width = 2.5
+num_lanes = 3
+car_length = 1.8
+
+# IDM parameters
+max_acceleration = 0.002
+comfortable_deceleration = 0.004
+min_gap = 1.5
+time_headway = 30.0
+braking_scale = 2 * math.sqrt(max_acceleration * comfortable_deceleration)
+
+# Lane changes
+lane_change_threshold = 0.0005
+safe_deceleration = 0.006
+lateral_speed = 0.04
+settled_distance = 0.05
+
+# Most cars drive() hands to the plain Python path
+few_cars = 32
+
+
+def lane_of(x):
+    """Index of the lane nearest each x, 0 being the leftmost"""
+    lane = np.rint(np.asarray(x) / lane_width).astype(np.int64) + 1
+    return np.minimum(np.maximum(lane, 0), num_lanes - 1)
+
+
+def idm_acceleration(speed, desired_speed, gap, leader_speed):
+    """IDM acceleration for each car; gap is inf where there is nobody ahead"""
+    wanted = min_gap + np.maximum(speed * (time_headway + (speed - leader_speed) / braking_scale), 0.0)
+    ratio = wanted / np.maximum(gap, 1e-3)
+    return free_acceleration(speed, desired_speed) - max_acceleration * (ratio * ratio)
+
+
+def free_acceleration(speed, desired_speed):
+    """IDM acceleration on an empty road"""
+    # The usual exponent of 4, squared twice since NumPy's power rounds differently to Python's
+    ratio = speed / np.maximum(desired_speed, 1e-6)
+    ratio = ratio * ratio
+    return max_acceleration * (1 - ratio * ratio)
+
+
+def drive(x, z, speed, target_x, desired_speed, group, obstacle_x, obstacle_z, obstacle_speed):
+    """Move the cars one tick, updating x, z, speed and target_x in place.
+
+    group gives the road (game) each car is on, and obstacle_* hold one player
+    car per road, indexed by group.
+    """
+    count = len(z)
+    if not count:
+        return
+    if count <= few_cars:
+        drive_few(x, z, speed, target_x, desired_speed, group, obstacle_x, obstacle_z, obstacle_speed)
+        return
+
+    # Cars and then one obstacle per road, as one set of arrays
+    all_z = np.concatenate([z, obstacle_z])
+    all_speed = np.concatenate([speed, obstacle_speed])
+    lane = lane_of(target_x)
+    bucket = np.concatenate([group, np.arange(len(obstacle_z))]) * num_lanes \
+        + np.concatenate([lane, lane_of(obstacle_x)])
+
+    # Sort key: roads one after another, each lane after the other, ahead (low z) first
+    low = all_z.min()
+    span = all_z.max() - low + 1.0
+    key = bucket * span + (all_z - low)
+    order = np.argsort(key, kind="stable")
+    sorted_bucket = bucket[order]
+
+    # Each car's leader is the entry before it in its own lane
+    same_lane = sorted_bucket[1:] == sorted_bucket[:-1]
+    leader = np.full(len(order), -1)
+    leader[order[1:][same_lane]] = order[:-1][same_lane]
+    leader = leader[:count]
+    acceleration = idm_acceleration(speed, desired_speed, np.where(leader >= 0, z - all_z[leader] - car_length, np.inf),
+                                    all_speed[leader])
+
+    # Lane changes, for cars that have finished their last one. A car gains
+    # nothing from another lane unless its leader holds it back, since no lane
+    # beats an empty road
+    candidates = (acceleration < free_acceleration(speed, desired_speed) - lane_change_threshold) \
+        & (np.abs(x - target_x) < settled_distance)
+    if candidates.any():
+        all_desired = np.concatenate([desired_speed, obstacle_speed])
+        best_gain = np.full(count, lane_change_threshold)
+        best_side = np.zeros(count, dtype=np.int64)
+        best_leader = np.full(count, -1)
+        for side in (-1, 1):
+            target = lane + side
+            movers = np.flatnonzero(candidates & (target >= 0) & (target < num_lanes))
+            if not movers.size:
+                continue
+            mover_z = z[movers]
+            target_bucket = group[movers] * num_lanes + target[movers]
+
+            # The entries either side of where the car would go in the target lane's sort
+            position = np.searchsorted(key[order], target_bucket * span + (mover_z - low))
+            before = np.maximum(position - 1, 0)
+            after = np.minimum(position, len(order) - 1)
+            new_leader = np.where((position > 0) & (sorted_bucket[before] == target_bucket), order[before], -1)
+            new_follower = np.where((position < len(order)) & (sorted_bucket[after] == target_bucket), order[after], -1)
+
+            front_gap = np.where(new_leader >= 0, mover_z - all_z[new_leader] - car_length, np.inf)
+            back_gap = np.where(new_follower >= 0, all_z[new_follower] - mover_z - car_length, np.inf)
+            gain = idm_acceleration(speed[movers], desired_speed[movers], front_gap, all_speed[new_leader]) \
+                - acceleration[movers]
+            follower_acceleration = idm_acceleration(all_speed[new_follower], all_desired[new_follower],
+                                                     back_gap, speed[movers])
+            safe = (front_gap > min_gap) & (back_gap > min_gap) & (
+                (new_follower < 0) | (follower_acceleration > -safe_deceleration))
+            better = safe & (gain > best_gain[movers])
+            chosen = movers[better]
+            best_gain[chosen] = gain[better]
+            best_side[chosen] = side
+            best_leader[chosen] = new_leader[better]
+
+        changing = np.flatnonzero(best_side)
+        if changing.size:
+            # Only one car pulls into any one gap per tick
+            gap_key = (group[changing] * num_lanes + lane[changing] + best_side[changing]) * (len(order) + 1) \
+                + best_leader[changing] + 1
+            _, first = np.unique(gap_key, return_index=True)
+            changing = changing[first]
+            target_x[changing] += best_side[changing] * lane_width
+
+    speed += acceleration
+    np.maximum(speed, 0.0, out=speed)
+    z -= speed
+    x += np.minimum(np.maximum(target_x - x, -lateral_speed), lateral_speed)
+
+
+def free_few(speed, desired_speed):
+    """free_acceleration() for one car"""
+    ratio = speed / (1e-6 if 1e-6 > desired_speed else desired_speed)
+    ratio = ratio * ratio
+    return max_acceleration * (1 - ratio * ratio)
+
+
+def idm_few(free, speed, gap, leader_speed):
+    """idm_acceleration() for one car, given its free_few() acceleration"""
+    wanted = speed * (time_headway + (speed - leader_speed) / braking_scale)
+    ratio = (min_gap + (0.0 if 0.0 > wanted else wanted)) / (1e-3 if 1e-3 > gap else gap)
+    return free - max_acceleration * (ratio * ratio)
+
+
+def drive_few(x, z, speed, target_x, desired_speed, group, obstacle_x, obstacle_z, obstacle_speed):
+    """drive() through drive_lists(), for when there are only a few cars"""
+    xs = x.tolist()
+    zs = z.tolist()
+    speeds = speed.tolist()
+    targets = target_x.tolist()
+    if drive_lists(xs, zs, speeds, targets, desired_speed.tolist(), group.tolist(),
+                   obstacle_x.tolist(), obstacle_z.tolist(), obstacle_speed.tolist()):
+        x[:] = xs
+        target_x[:] = targets
+    z[:] = zs
+    speed[:] = speeds
+
+
+def drive_lists(xs, zs, speeds, targets, desired, groups, obstacle_x, obstacle_z, obstacle_speed):
+    """drive() one car at a time, step for step, on lists of floats.
+
+    xs, zs, speeds and targets are updated in place; the return value says
+    whether any x or target changed, since most ticks every car keeps to its
+    lane. Conditional expressions stand in for NumPy's maximum and minimum,
+    and a car with nobody ahead skips the gap term, which comes to exactly zero.
+    """
+    count = len(zs)
+    if not count:
+        return False
+    all_z = zs + obstacle_z
+    all_speed = speeds + obstacle_speed
+    low = min(all_z)
+    span = max(all_z) - low + 1.0
+
+    # One loop over cars and obstacles rather than a comprehension per list,
+    # which is most of the cost when there are only one or two cars
+    lane = []
+    bucket = []
+    key = []
+    for road, x, z in zip(groups + list(range(len(obstacle_z))), targets + obstacle_x, all_z):
+        # lane_of(x)
+        index = round(x / lane_width) + 1
+        index = 0 if index < 0 else num_lanes - 1 if index > num_lanes - 1 else index
+        lane.append(index)
+        index += road * num_lanes
+        bucket.append(index)
+        key.append(index * span + (z - low))
+    order = sorted(range(len(key)), key=key.__getitem__)
+    total = len(order)
+
+    free = []
+    for s, d in zip(speeds, desired):
+        free.append(free_few(s, d))
+    acceleration = free[:]
+    ahead = order[0]
+    for car in order[1:]:
+        if car < count and bucket[car] == bucket[ahead]:
+            acceleration[car] = idm_few(free[car], speeds[car], zs[car] - all_z[ahead] - car_length,
+                                        all_speed[ahead])
+        ahead = car
+
+    # Lane changes, as in drive()
+    best = {}
+    sorted_key = None
+    for i in range(count):
+        if not (acceleration[i] < free[i] - lane_change_threshold and abs(xs[i] - targets[i]) < settled_distance):
+            continue
+        if sorted_key is None:
+            sorted_key = [key[j] for j in order]
+            sorted_bucket = [bucket[j] for j in order]
+        mover_z = zs[i]
+        mover_speed = speeds[i]
+        best_gain = lane_change_threshold
+        for side in (-1, 1):
+            target = lane[i] + side
+            if not 0 <= target < num_lanes:
+                continue
+            target_bucket = groups[i] * num_lanes + target
+            position = bisect.bisect_left(sorted_key, target_bucket * span + (mover_z - low))
+            new_leader = order[position - 1] if position > 0 and sorted_bucket[position - 1] == target_bucket else -1
+            new_follower = order[position] if position < total and sorted_bucket[position] == target_bucket else -1
+
+            front_gap = mover_z - all_z[new_leader] - car_length if new_leader >= 0 else math.inf
+            back_gap = all_z[new_follower] - mover_z - car_length if new_follower >= 0 else math.inf
+            if not (front_gap > min_gap and back_gap > min_gap):
+                continue
+            if new_follower >= 0:
+                follower_speed = all_speed[new_follower]
+                follower_free = free[new_follower] if new_follower < count \
+                    else free_few(follower_speed, follower_speed)
+                if not idm_few(follower_free, follower_speed, back_gap, mover_speed) > -safe_deceleration:
+                    continue
+            new_acceleration = free[i] if new_leader < 0 \
+                else idm_few(free[i], mover_speed, front_gap, all_speed[new_leader])
+            gain = new_acceleration - acceleration[i]
+            if gain > best_gain:
+                best_gain = gain
+                best[i] = (side, new_leader)
+
+    # Only one car pulls into any one gap per tick
+    gaps = set()
+    for i in sorted(best):
+        side, new_leader = best[i]
+        gap = (bucket[i] + side, new_leader)
+        if gap not in gaps:
+            gaps.add(gap)
+            targets[i] += side * lane_width
+
+    sideways = bool(best)
+    for i in range(count):
+        moved = speeds[i] + acceleration[i]
+        moved = 0.0 if 0.0 > moved else moved
+        speeds[i] = moved
+        zs[i] -= moved
+        shift = targets[i] - xs[i]
+        if shift:
+            sideways = True
+            xs[i] += -lateral_speed if -lateral_speed > shift else lateral_speed if lateral_speed < shift else shift
+    return sideways
@@ -0,0 +1,168 @@
+"""Compiled geometry for the models in models.py.
+
+The first time a model is drawn its mesh is built and compiled into a display
+list. After that, drawing it is a single glCallList under whatever transform is
+current. Geometry that changes over time lives in a VertexBuffer instead, where
+parts of it can be rewritten in place.
+
+While shaders.py's program is in use (use_attributes is set), vertex buffers
+feed generic attributes 0-2 instead of the fixed-function arrays, and models
+are drawn from vertex buffers, since display lists capture fixed-function state.
+"""
+from OpenGL.GL import *
+import ctypes
+
+import numpy as np
+
+import models
+from meshes import colored
+
+# Bind vertex buffers to generic attributes for the shader pipeline
+use_attributes = False
+
+
+def draw_mesh(mesh):
+    """Draw a mesh from meshes.py with client-side vertex arrays"""
+    positions = np.ascontiguousarray(mesh[:, 0:3])
+    normals = np.ascontiguousarray(mesh[:, 3:6])
+
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glEnableClientState(GL_NORMAL_ARRAY)
+    glVertexPointer(3, GL_FLOAT, 0, positions)
+    glNormalPointer(GL_FLOAT, 0, normals)
+    if mesh.shape[1] > 6:
+        colors = np.ascontiguousarray(mesh[:, 6:9])
+        glEnableClientState(GL_COLOR_ARRAY)
+        glColorPointer(3, GL_FLOAT, 0, colors)
+
+    glDrawArrays(GL_TRIANGLES, 0, len(mesh))
+
+    glDisableClientState(GL_COLOR_ARRAY)
+    glDisableClientState(GL_NORMAL_ARRAY)
+    glDisableClientState(GL_VERTEX_ARRAY)
+
+
+class GeometryCache:
+    def __init__(self, builders=None):
+        self.builders = models.builders if builders is None else builders
+        self.lists = {}
+        self.buffers = {}
+
+    def draw(self, name):
+        if use_attributes:
+            buffer = self.buffers.get(name)
+            if buffer is None:
+                buffer = self.upload(name)
+            buffer.draw()
+            return
+        display_list = self.lists.get(name)
+        if display_list is None:
+            display_list = self.compile(name)
+        glCallList(display_list)
+
+    def compile(self, name):
+        mesh = self.builders[name]()
+        display_list = glGenLists(1)
+        glNewList(display_list, GL_COMPILE)
+        # A colorless part must keep the glColor set by the caller, so don't let
+        # the baked colors of other parts leak into the list's state
+        glPushAttrib(GL_CURRENT_BIT)
+        draw_mesh(mesh)
+        glPopAttrib()
+        glEndList()
+        self.lists[name] = display_list
+        return display_list
+
+    def upload(self, name):
+        mesh = self.builders[name]()
+        # Colorless parts come out white, and the shader tints them
+        if mesh.shape[1] < 9:
+            mesh = colored(mesh, (1.0, 1.0, 1.0))
+        buffer = self.buffers[name] = VertexBuffer()
+        buffer.upload(mesh)
+        return buffer
+
+    def release(self):
+        for display_list in self.lists.values():
+            glDeleteLists(display_list, 1)
+        self.lists = {}
+        for buffer in self.buffers.values():
+            buffer.release()
+        self.buffers = {}
+
+
+class VertexBuffer:
+    """A GL vertex buffer of interleaved x, y, z, nx, ny, nz, r, g, b float32 vertices"""
+    stride = 9 * 4
+
+    def __init__(self):
+        self.buffer = None
+        self.capacity = 0
+        self.count = 0
+
+    def upload(self, vertices):
+        """Replace the whole buffer contents"""
+        vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 9)
+        if self.buffer is None:
+            self.buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.capacity = self.count = len(vertices)
+
+    def update(self, first_vertex, vertices):
+        """Overwrite a range of vertices starting at first_vertex"""
+        vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 9)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glBufferSubData(GL_ARRAY_BUFFER, first_vertex * self.stride, vertices.nbytes, vertices)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def bind_attributes(self):
+        """Feed position, normal and color to generic attributes 0, 1 and 2"""
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        for location in range(3):
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 3, GL_FLOAT, GL_FALSE, self.stride, ctypes.c_void_p(12 * location))
+
+    def unbind_attributes(self):
+        for location in range(3):
+            glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def bind(self):
+        if use_attributes:
+            self.bind_attributes()
+            return
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, self.stride, ctypes.c_void_p(0))
+        glNormalPointer(GL_FLOAT, self.stride, ctypes.c_void_p(12))
+        glColorPointer(3, GL_FLOAT, self.stride, ctypes.c_void_p(24))
+
+    def unbind(self):
+        if use_attributes:
+            self.unbind_attributes()
+            return
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, mode=GL_TRIANGLES, first=0, count=None):
+        if self.buffer is None or not self.count:
+            return
+        if count is None:
+            count = self.count - first
+        self.bind()
+        glDrawArrays(mode, first, count)
+        self.unbind()
+        # Vertex colors leave the current color undefined
+        glColor3f(1.0, 1.0, 1.0)
+
+    def release(self):
+        if self.buffer is not None:
+            glDeleteBuffers(1, [self.buffer])
+        self.buffer = None
+        self.capacity = self.count = 0
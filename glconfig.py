@@ -0,0 +1,21 @@
+"""PyOpenGL switches for the renderer.
+
+By default PyOpenGL calls glGetError after every GL call, logs every error and
+checks the size of every array passed in. That is all turned off unless the
+HIGHWAY_GL_DEBUG environment variable is set to something other than 0.
+
+PyOpenGL reads these switches when OpenGL.GL is first imported, so this module
+has to be imported before that. The simulation never imports OpenGL at all.
+
+PyOpenGL's EGL bindings cannot be imported with error checking off, so it stays
+on when rendering offscreen through EGL.
+"""
+import os
+
+import OpenGL
+
+debug = os.environ.get("HIGHWAY_GL_DEBUG", "0") not in ("", "0")
+
+OpenGL.ERROR_CHECKING = debug or os.environ.get("PYOPENGL_PLATFORM") == "egl"
+OpenGL.ERROR_LOGGING = debug
+OpenGL.ARRAY_SIZE_CHECKING = debug
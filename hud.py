@@ -0,0 +1,197 @@
+"""HUD text drawn from a cached glyph atlas.
+
+The GLUT bitmap fonts are rasterized once into a texture (by drawing every
+printable character into a framebuffer object). After that every HUD string is
+a batch of textured quads that is only rebuilt when its text changes, and the
+whole HUD is one glDrawArrays instead of a glutBitmapCharacter call per
+character per frame.
+
+Building the atlas needs GLUT to be initialized, because the glyphs come from
+GLUT's fonts. Without it (for example in an offscreen context) the HUD draws
+nothing.
+"""
+from OpenGL.GL import *
+from OpenGL.GLUT import *
+import numpy as np
+
+first_char = 32
+last_char = 126
+columns = 16
+padding = 2
+
+# Font name: (GLUT font, cell height, pixels below the baseline)
+fonts = {
+    "large": (GLUT_BITMAP_HELVETICA_18, 24, 6),
+    "small": (GLUT_BITMAP_HELVETICA_12, 16, 4),
+}
+
+
+class GlyphAtlas:
+    def __init__(self):
+        self.texture = None
+        self.width = 0
+        self.height = 0
+        # Font name: (cell width, cell height, descent, advances, cell origins)
+        self.layout = {}
+
+    def build(self):
+        """Rasterize every font into one texture; returns False if GLUT isn't there to do it"""
+        if not glutGet(GLUT_INIT_STATE):
+            return False
+
+        rows = (last_char - first_char + columns) // columns
+        top = 0
+        for name, (font, cell_height, descent) in fonts.items():
+            advances = [glutBitmapWidth(font, c) for c in range(first_char, last_char + 1)]
+            cell_width = max(advances) + 2 * padding
+            origins = [(padding + (i % columns) * cell_width, top + (i // columns) * cell_height)
+                       for i in range(len(advances))]
+            self.layout[name] = (cell_width, cell_height, descent, advances, origins)
+            self.width = max(self.width, columns * cell_width)
+            top += rows * cell_height
+        self.height = top
+
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, self.width, self.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, self.texture, 0)
+
+        glPushAttrib(GL_ALL_ATTRIB_BITS)
+        glDisable(GL_LIGHTING)
+        glDisable(GL_DEPTH_TEST)
+        glViewport(0, 0, self.width, self.height)
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, self.width, 0, self.height, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+        glClearColor(0.0, 0.0, 0.0, 0.0)
+        glClear(GL_COLOR_BUFFER_BIT)
+        glColor4f(1.0, 1.0, 1.0, 1.0)
+        for name, (font, cell_height, descent) in fonts.items():
+            origins = self.layout[name][4]
+            for i, (x, y) in enumerate(origins):
+                glRasterPos2i(x, y + descent)
+                glutBitmapCharacter(font, first_char + i)
+
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glPopAttrib()
+
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glDeleteFramebuffers(1, [framebuffer])
+        return True
+
+    def quads(self, text, x, y, font):
+        """Positions and texture coordinates of the triangles spelling text with its baseline at (x, y)"""
+        cell_width, cell_height, descent, advances, origins = self.layout[font]
+        codes = np.frombuffer(text.encode("ascii", "replace"), dtype=np.uint8).astype(np.int64)
+        codes = np.clip(codes, first_char, last_char) - first_char
+
+        advance = np.asarray(advances)[codes]
+        pen = x + np.concatenate([[0], np.cumsum(advance)[:-1]])
+        left = pen - padding
+        bottom = np.full(len(codes), y - descent)
+
+        cell = np.asarray(origins)[codes]
+        u0 = (cell[:, 0] - padding) / self.width
+        v0 = cell[:, 1] / self.height
+        u1 = u0 + cell_width / self.width
+        v1 = v0 + cell_height / self.height
+
+        corners = [(0, 0), (1, 0), (1, 1), (0, 0), (1, 1), (0, 1)]
+        positions = np.empty((len(codes), 6, 2), dtype=np.float32)
+        texcoords = np.empty((len(codes), 6, 2), dtype=np.float32)
+        for k, (cx, cy) in enumerate(corners):
+            positions[:, k, 0] = left + cx * cell_width
+            positions[:, k, 1] = bottom + cy * cell_height
+            texcoords[:, k, 0] = u1 if cx else u0
+            texcoords[:, k, 1] = v1 if cy else v0
+        return positions.reshape(-1, 2), texcoords.reshape(-1, 2)
+
+
+class Hud:
+    """Lines of HUD text, each kept under a key with its quads cached until its text changes"""
+    def __init__(self):
+        self.atlas = None
+        self.lines = {}
+        self.shown = set()
+        self.previous = set()
+        self.dirty = True
+        self.positions = self.texcoords = self.colors = None
+
+    def begin(self):
+        """Start a frame; keys not given text again before draw() are hidden"""
+        self.previous = self.shown
+        self.shown = set()
+
+    def text(self, key, text, x, y, font="large", color=(1.0, 1.0, 1.0)):
+        line = (text, x, y, font, tuple(color))
+        cached = self.lines.get(key)
+        if cached is None or cached[0] != line:
+            self.lines[key] = (line, None)
+            self.dirty = True
+        self.shown.add(key)
+
+    def draw(self):
+        if self.atlas is None:
+            atlas = GlyphAtlas()
+            self.atlas = atlas if atlas.build() else False
+        if not self.atlas:
+            return
+        if self.dirty or self.shown != self.previous:
+            self.rebuild()
+        if not len(self.positions):
+            return
+
+        glPushAttrib(GL_ENABLE_BIT | GL_COLOR_BUFFER_BIT | GL_TEXTURE_BIT)
+        glDisable(GL_LIGHTING)
+        glDisable(GL_DEPTH_TEST)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.atlas.texture)
+        glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, self.positions)
+        glTexCoordPointer(2, GL_FLOAT, 0, self.texcoords)
+        glColorPointer(3, GL_FLOAT, 0, self.colors)
+        glDrawArrays(GL_TRIANGLES, 0, len(self.positions))
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glPopAttrib()
+
+    def rebuild(self):
+        positions = [np.zeros((0, 2), dtype=np.float32)]
+        texcoords = [np.zeros((0, 2), dtype=np.float32)]
+        colors = [np.zeros((0, 3), dtype=np.float32)]
+        for key in self.shown:
+            line, quads = self.lines[key]
+            if quads is None:
+                text, x, y, font, color = line
+                quads = self.atlas.quads(text, x, y, font)
+                self.lines[key] = (line, quads)
+            positions.append(quads[0])
+            texcoords.append(quads[1])
+            colors.append(np.tile(np.asarray(line[4], dtype=np.float32), (len(quads[0]), 1)))
+        self.positions = np.ascontiguousarray(np.concatenate(positions))
+        self.texcoords = np.ascontiguousarray(np.concatenate(texcoords))
+        self.colors = np.ascontiguousarray(np.concatenate(colors))
+        self.dirty = False
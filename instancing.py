@@ -0,0 +1,307 @@
+"""Batched drawing of the roadside trees and houses, and of the CPU traffic.
+
+The fixed-function pipeline this game uses has no hardware instancing, so each
+batch keeps per-instance arrays (position, scale, colors) and expands them into
+pre-transformed copies of the model in one vertex buffer. An instance's vertex
+range is its own mesh: for a house it is painted with the appearance the
+simulation rolled for it, and it is rewritten only when the simulation recycles
+that object.
+
+Every object has a near and a far level of detail. Each frame the instances are
+tested against the view frustum in one NumPy pass, and the visible ones are
+drawn with a single glMultiDrawArrays per level of detail.
+
+CPU cars move every tick, so rewriting their copies of the model would cost
+more than drawing them one by one. Where OpenGL 3.3 is available they are drawn
+with real instancing instead: each frame the visible cars' x, z and color go
+into an instance buffer, and one glDrawElementsInstanced draws them all.
+"""
+import ctypes
+
+from OpenGL.GL import *
+import numpy as np
+
+import models
+import shaders
+from geometry import VertexBuffer
+from meshes import colored
+
+# Ground distance from the camera beyond which the far model is drawn
+tree_lod_distance = 60.0
+house_lod_distance = 80.0
+
+
+class InstanceBatch:
+    """count copies of one colored mesh, stored back to back in a vertex buffer"""
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.vertices = np.zeros((0,) + mesh.shape, dtype=np.float32)
+        self.buffer = VertexBuffer()
+        self.dirty = set()
+        self.resized = True
+
+    def resize(self, count):
+        if count != len(self.vertices):
+            self.vertices = np.zeros((count,) + self.mesh.shape, dtype=np.float32)
+            self.resized = True
+
+    def mark(self, indices):
+        self.dirty.update(int(i) for i in indices)
+
+    def upload(self):
+        if self.resized:
+            self.buffer.upload(self.vertices)
+            self.resized = False
+        elif self.dirty:
+            # Rewrite each run of consecutive changed instances with one call
+            per_instance = self.mesh.shape[0]
+            indices = sorted(self.dirty)
+            start = previous = indices[0]
+            for i in indices[1:] + [None]:
+                if i is not None and i == previous + 1:
+                    previous = i
+                    continue
+                self.buffer.update(start * per_instance, self.vertices[start:previous + 1])
+                if i is not None:
+                    start = previous = i
+        self.dirty.clear()
+
+    def draw(self, indices=None):
+        """Draw every instance, or only the given ones"""
+        self.upload()
+        if indices is None:
+            self.buffer.draw()
+            return
+        if not len(indices) or not self.buffer.count:
+            return
+        per_instance = self.mesh.shape[0]
+        firsts = np.asarray(indices, dtype=np.int32) * per_instance
+        counts = np.full(len(firsts), per_instance, dtype=np.int32)
+        self.buffer.bind()
+        glMultiDrawArrays(GL_TRIANGLES, firsts, counts, len(firsts))
+        self.buffer.unbind()
+        glColor3f(1.0, 1.0, 1.0)
+
+    def release(self):
+        self.buffer.release()
+        self.resized = True
+
+
+def _rotate_y(points, sides):
+    """Turn house meshes to face the road: +90 degrees about y on the left side, -90 on the right"""
+    x = points[..., 0].copy()
+    z = points[..., 2].copy()
+    sides = sides[:, None]
+    points[..., 0] = z * sides
+    points[..., 2] = -x * sides
+
+
+def _draw_lods(near, far, visible, distances, lod_distance):
+    """Draw the visible instances from the near or far batch by distance; return how many were drawn"""
+    close = distances < lod_distance
+    near.draw(np.flatnonzero(visible & close))
+    far.draw(np.flatnonzero(visible & ~close))
+    return int(visible.sum())
+
+
+class TreeInstances:
+    def __init__(self):
+        self.near = InstanceBatch(models.tree())
+        self.far = InstanceBatch(models.tree(detail=5))
+        self.source = None
+        self.x = np.zeros(0)
+        self.z = np.zeros(0)
+        self.scale = np.zeros(0)
+        self.drawn = 0
+
+    def sync(self, state):
+        """Pick up trees the simulation created or recycled since the last frame"""
+        if state.trees is not self.source:
+            self.source = state.trees
+            count = len(state.trees)
+            self.x = np.zeros(count)
+            self.z = np.zeros(count)
+            self.scale = np.zeros(count)
+            self.near.resize(count)
+            self.far.resize(count)
+            changed = range(count)
+        elif state.changed_trees:
+            changed = sorted(state.changed_trees)
+        else:
+            return
+        state.changed_trees.clear()
+
+        indices = np.fromiter(changed, dtype=np.int64)
+        for i in indices:
+            self.x[i], self.z[i], self.scale[i] = state.trees[i]
+        for batch in (self.near, self.far):
+            self.place(batch, indices)
+
+    def place(self, batch, indices):
+        vertices = np.repeat(batch.mesh[None], len(indices), axis=0)
+        vertices[:, :, :3] *= self.scale[indices, None, None]
+        vertices[:, :, 0] += self.x[indices, None]
+        vertices[:, :, 2] += self.z[indices, None]
+        batch.vertices[indices] = vertices
+        batch.mark(indices)
+
+    def draw(self, state, frustum=None):
+        self.sync(state)
+        if frustum is None:
+            self.near.draw()
+            self.drawn = len(self.x)
+            return
+
+        # Trunk and leaves fit in a sphere around the middle of the tree
+        centers = np.stack([self.x, 2.25 * self.scale, self.z], axis=1)
+        visible = frustum.spheres_visible(centers, 2.5 * self.scale)
+        self.drawn = _draw_lods(self.near, self.far, visible, frustum.distances(self.x, self.z), tree_lod_distance)
+
+
+class HouseInstances:
+    def __init__(self):
+        mesh, near_ranges = models.house()
+        billboard, far_ranges = models.house_billboard()
+        self.near = InstanceBatch(mesh)
+        self.far = InstanceBatch(billboard)
+        self.ranges = {self.near: near_ranges, self.far: far_ranges}
+        self.source = None
+        self.x = np.zeros(0)
+        self.z = np.zeros(0)
+        self.house_type = np.zeros(0, dtype=np.int64)
+        self.colors = {part: np.zeros((0, 3)) for part in near_ranges}
+        self.drawn = 0
+
+    def sync(self, state):
+        """Pick up houses the simulation created or recycled since the last frame"""
+        if state.houses is not self.source:
+            self.source = state.houses
+            count = len(state.houses)
+            self.x = np.zeros(count)
+            self.z = np.zeros(count)
+            self.house_type = np.zeros(count, dtype=np.int64)
+            self.colors = {part: np.zeros((count, 3)) for part in self.colors}
+            self.near.resize(count)
+            self.far.resize(count)
+            changed = range(count)
+        elif state.changed_houses:
+            changed = sorted(state.changed_houses)
+        else:
+            return
+        state.changed_houses.clear()
+
+        indices = np.fromiter(changed, dtype=np.int64)
+        for i in indices:
+            self.x[i], self.z[i], self.house_type[i] = state.houses[i]
+            appearance = state.house_colors[i]
+            for part, colors in self.colors.items():
+                colors[i] = appearance[part]
+        for batch in (self.near, self.far):
+            self.place(batch, indices)
+
+    def place(self, batch, indices):
+        vertices = np.repeat(batch.mesh[None], len(indices), axis=0)
+        sides = np.where(self.x[indices] < 0, 1.0, -1.0)
+        _rotate_y(vertices[:, :, 0:3], sides)
+        _rotate_y(vertices[:, :, 3:6], sides)
+        vertices[:, :, 0] += self.x[indices, None]
+        vertices[:, :, 2] += self.z[indices, None]
+
+        for part, (first, last) in self.ranges[batch].items():
+            vertices[:, first:last, 6:9] = self.colors[part][indices, None, :]
+
+        batch.vertices[indices] = vertices
+        batch.mark(indices)
+
+    def draw(self, state, frustum=None):
+        self.sync(state)
+        if frustum is None:
+            self.near.draw()
+            self.drawn = len(self.x)
+            return
+
+        centers = np.stack([self.x, np.full(len(self.x), 4.0), self.z], axis=1)
+        visible = frustum.spheres_visible(centers, np.full(len(self.x), 9.0))
+        self.drawn = _draw_lods(self.near, self.far, visible, frustum.distances(self.x, self.z), house_lod_distance)
+
+
+class TrafficInstances:
+    """Every visible CPU car in one instanced draw call, with shaders.traffic_vertex_source"""
+    def __init__(self):
+        # Each part's vertices are shared between its triangles through an index
+        # buffer, so every car shades about a fifth of the vertices it would
+        # as plain triangles
+        parts = [colored(models.car_lower(), (1.0, 1.0, 1.0)), colored(models.car_upper(), (1.0, 1.0, 1.0)),
+                 models.car_wheels()]
+        vertices = []
+        indices = []
+        first = 0
+        for part in parts:
+            unique, inverse = np.unique(part, axis=0, return_inverse=True)
+            vertices.append(unique)
+            indices.append(inverse.reshape(-1) + first)
+            first += len(unique)
+        lower, upper = len(vertices[0]), len(vertices[1])
+        self.mesh = VertexBuffer()
+        self.mesh.upload(np.concatenate(vertices))
+        indices = np.concatenate(indices).astype(np.uint16)
+        self.index_count = len(indices)
+        self.indices = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.indices)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.instances = glGenBuffers(1)
+        self.program = shaders.compile_program(shaders.traffic_vertex_source)
+        self.uniforms = {name: glGetUniformLocation(self.program, name)
+                         for name in ("projection", "view", "upper_first", "wheels_first")}
+        glUseProgram(self.program)
+        glUniform1i(self.uniforms["upper_first"], lower)
+        glUniform1i(self.uniforms["wheels_first"], lower + upper)
+        glUseProgram(0)
+        self.drawn = 0
+
+    def draw(self, state, frustum):
+        """Draw the cars inside the frustum, through its camera"""
+        traffic = state.cpu_cars
+        count = traffic.count
+        centers = np.stack([traffic.x[:count], np.full(count, 0.5), traffic.z[:count]], axis=1)
+        visible = np.flatnonzero(frustum.spheres_visible(centers, np.full(count, 1.5)))
+        self.drawn = len(visible)
+        if not self.drawn:
+            return
+
+        # x, z, r, g, b per car
+        instances = np.empty((self.drawn, 5), dtype=np.float32)
+        instances[:, 0] = traffic.x[visible]
+        instances[:, 1] = traffic.z[visible]
+        instances[:, 2:] = traffic.color[visible]
+
+        previous = glGetIntegerv(GL_CURRENT_PROGRAM)
+        glUseProgram(self.program)
+        glUniformMatrix4fv(self.uniforms["projection"], 1, GL_TRUE, frustum.projection.astype(np.float32))
+        glUniformMatrix4fv(self.uniforms["view"], 1, GL_TRUE, frustum.view.astype(np.float32))
+
+        self.mesh.bind_attributes()
+        glBindBuffer(GL_ARRAY_BUFFER, self.instances)
+        glBufferData(GL_ARRAY_BUFFER, instances.nbytes, instances, GL_STREAM_DRAW)
+        glEnableVertexAttribArray(3)
+        glVertexAttribPointer(3, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
+        glVertexAttribDivisor(3, 1)
+        glEnableVertexAttribArray(4)
+        glVertexAttribPointer(4, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(8))
+        glVertexAttribDivisor(4, 1)
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.indices)
+        glDrawElementsInstanced(GL_TRIANGLES, self.index_count, GL_UNSIGNED_SHORT, ctypes.c_void_p(0), self.drawn)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        for location in (3, 4):
+            glVertexAttribDivisor(location, 0)
+            glDisableVertexAttribArray(location)
+        self.mesh.unbind_attributes()
+        glUseProgram(int(previous))
+
+    def release(self):
+        self.mesh.release()
+        glDeleteBuffers(2, [self.indices, self.instances])
+        glDeleteProgram(self.program)
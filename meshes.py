@@ -0,0 +1,130 @@
+"""Triangle meshes built with NumPy.
+
+Each shape follows the matching GLUT solid (glutSolidCube, glutSolidSphere,
+glutSolidCylinder, glutSolidCone): same size parameters, same orientation along
++z, same slice and stack counts. A mesh is a float32 array with one row per
+vertex and three vertices per triangle. Rows hold x, y, z, nx, ny, nz, plus
+r, g, b once colored.
+"""
+import math
+
+import numpy as np
+
+
+def _grid(positions, normals):
+    """Triangulate a (rows, cols, 3) grid of positions and normals"""
+    a = np.concatenate([positions, normals], axis=2)
+    p00 = a[:-1, :-1].reshape(-1, 6)
+    p10 = a[1:, :-1].reshape(-1, 6)
+    p11 = a[1:, 1:].reshape(-1, 6)
+    p01 = a[:-1, 1:].reshape(-1, 6)
+    triangles = np.stack([p00, p10, p11, p00, p11, p01], axis=1)
+    return triangles.reshape(-1, 6).astype(np.float32)
+
+
+def _disc(radius, z, slices, facing):
+    """Flat cap at height z made of a triangle fan, facing +z (1) or -z (-1)"""
+    phi = np.linspace(0.0, 2 * math.pi, slices + 1)
+    rim = np.stack([radius * np.cos(phi), radius * np.sin(phi), np.full_like(phi, z)], axis=1)
+    centre = np.array([0.0, 0.0, z])
+    if facing < 0:
+        rim = rim[::-1]
+    triangles = np.empty((slices, 3, 6))
+    triangles[:, 0, :3] = centre
+    triangles[:, 1, :3] = rim[:-1]
+    triangles[:, 2, :3] = rim[1:]
+    triangles[:, :, 3:] = (0.0, 0.0, facing)
+    return triangles.reshape(-1, 6).astype(np.float32)
+
+
+def box(size_x, size_y, size_z):
+    """Axis-aligned box centred on the origin"""
+    hx, hy, hz = size_x / 2, size_y / 2, size_z / 2
+    faces = [
+        ((1, 0, 0), [(hx, -hy, -hz), (hx, hy, -hz), (hx, hy, hz), (hx, -hy, hz)]),
+        ((-1, 0, 0), [(-hx, -hy, hz), (-hx, hy, hz), (-hx, hy, -hz), (-hx, -hy, -hz)]),
+        ((0, 1, 0), [(-hx, hy, -hz), (-hx, hy, hz), (hx, hy, hz), (hx, hy, -hz)]),
+        ((0, -1, 0), [(-hx, -hy, hz), (-hx, -hy, -hz), (hx, -hy, -hz), (hx, -hy, hz)]),
+        ((0, 0, 1), [(-hx, -hy, hz), (hx, -hy, hz), (hx, hy, hz), (-hx, hy, hz)]),
+        ((0, 0, -1), [(hx, -hy, -hz), (-hx, -hy, -hz), (-hx, hy, -hz), (hx, hy, -hz)]),
+    ]
+    rows = []
+    for normal, (a, b, c, d) in faces:
+        for corner in (a, b, c, a, c, d):
+            rows.append(corner + normal)
+    return np.array(rows, dtype=np.float32)
+
+
+def sphere(radius, slices, stacks):
+    theta = np.linspace(0.0, math.pi, stacks + 1)[:, None]
+    phi = np.linspace(0.0, 2 * math.pi, slices + 1)[None, :]
+    normals = np.stack(np.broadcast_arrays(np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)), axis=2)
+    return _grid(normals * radius, normals)
+
+
+def cylinder(radius, height, slices, stacks):
+    """Open tube from z=0 to z=height, closed with a cap at each end"""
+    z = np.linspace(0.0, height, stacks + 1)[:, None]
+    phi = np.linspace(0.0, 2 * math.pi, slices + 1)[None, :]
+    cos, sin, z = np.broadcast_arrays(np.cos(phi), np.sin(phi), z)
+    side = _grid(np.stack([radius * cos, radius * sin, z], axis=2), np.stack([cos, sin, np.zeros_like(z)], axis=2))
+    return np.concatenate([side, _disc(radius, 0.0, slices, -1), _disc(radius, height, slices, 1)])
+
+
+def cone(base, height, slices, stacks):
+    """Cone with its base disc at z=0 and its tip at z=height"""
+    z = np.linspace(0.0, height, stacks + 1)[:, None]
+    phi = np.linspace(0.0, 2 * math.pi, slices + 1)[None, :]
+    cos, sin, z = np.broadcast_arrays(np.cos(phi), np.sin(phi), z)
+    r = base * (1.0 - z / height)
+    slope = math.hypot(height, base)
+    positions = np.stack([r * cos, r * sin, z], axis=2)
+    normals = np.stack([cos * height / slope, sin * height / slope, np.full_like(z, base / slope)], axis=2)
+    return np.concatenate([_grid(positions, normals), _disc(base, 0.0, slices, -1)])
+
+
+def translation(x, y, z):
+    m = np.identity(4)
+    m[:3, 3] = (x, y, z)
+    return m
+
+
+def scaling(x, y, z):
+    return np.diag([x, y, z, 1.0])
+
+
+def rotation(angle, x, y, z):
+    """Rotation matrix with glRotatef's arguments: degrees about the axis (x, y, z)"""
+    axis = np.array([x, y, z], dtype=float)
+    axis /= np.linalg.norm(axis)
+    x, y, z = axis
+    c = math.cos(math.radians(angle))
+    s = math.sin(math.radians(angle))
+    m = np.identity(4)
+    m[:3, :3] = [
+        [x * x * (1 - c) + c, x * y * (1 - c) - z * s, x * z * (1 - c) + y * s],
+        [y * x * (1 - c) + z * s, y * y * (1 - c) + c, y * z * (1 - c) - x * s],
+        [z * x * (1 - c) - y * s, z * y * (1 - c) + x * s, z * z * (1 - c) + c],
+    ]
+    return m
+
+
+def transform(mesh, *matrices):
+    """Apply matrices to a mesh in the order glMultMatrix would (the last one acts first)"""
+    m = np.identity(4)
+    for matrix in matrices:
+        m = m @ matrix
+    out = mesh.copy()
+    out[:, :3] = mesh[:, :3] @ m[:3, :3].T + m[:3, 3]
+    normals = mesh[:, 3:6] @ np.linalg.inv(m[:3, :3])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    out[:, 3:6] = normals / np.where(lengths > 0, lengths, 1.0)
+    return out
+
+
+def colored(mesh, color):
+    """Give every vertex of an uncolored mesh the same color"""
+    out = np.empty((len(mesh), 9), dtype=np.float32)
+    out[:, :6] = mesh[:, :6]
+    out[:, 6:] = color
+    return out
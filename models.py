@@ -0,0 +1,120 @@
+"""Meshes for every model the game draws, built the way the draw_* functions used to.
+
+Parts that always have the same color are baked with it. Parts whose color
+changes per object (CPU car bodies, house walls, doors and windows) are left
+uncolored and take whatever glColor is current when they are drawn.
+"""
+import numpy as np
+
+from meshes import box, sphere, cylinder, cone, translation, scaling, rotation, transform, colored
+
+# House proportions from draw_house
+house_scale = 2.0
+house_width = 2.5 * house_scale * 2.0
+house_height = 2.0 * house_scale * 1.5
+house_depth = 2.5 * house_scale
+house_window_positions = [
+    (-0.8 * house_scale, 1.2 * house_scale), (0.8 * house_scale, 1.2 * house_scale),
+    (-0.8 * house_scale, 0.8 * house_scale), (0.8 * house_scale, 0.8 * house_scale)
+]
+
+# Car wheel placement from draw_car and draw_cpu_car
+wheel_offset = 0.6
+wheel_height = -0.3
+right_wheel_offset = wheel_offset - 0.1
+wheel_positions = [
+    (-wheel_offset, wheel_height, 0.7), (right_wheel_offset, wheel_height, 0.7),
+    (-wheel_offset, wheel_height, -0.7), (right_wheel_offset, wheel_height, -0.7),
+]
+
+
+def wheel():
+    rim = colored(cylinder(0.2, 0.1, 16, 8), (0.2, 0.2, 0.1))
+    tire = colored(transform(sphere(0.08, 16, 8), translation(0.0, 0.0, 0.05)), (0.3, 0.3, 0.3))
+    return transform(np.concatenate([rim, tire]), rotation(90, 0, 1, 0))
+
+
+def car_wheels():
+    return np.concatenate([transform(wheel(), translation(*position)) for position in wheel_positions])
+
+
+def car_lower():
+    return box(0.9, 0.45, 1.8)
+
+
+def car_upper():
+    return transform(box(1.0, 1.0, 1.0), translation(0.0, 0.4, 0.0), scaling(0.8, 0.4, 1.2))
+
+
+def player_car():
+    return np.concatenate([
+        colored(car_lower(), (1.0, 0.0, 0.0)),
+        colored(car_upper(), (0.8, 0.8, 1.0)),
+        car_wheels(),
+    ])
+
+
+def tree(detail=10):
+    """A tree whose trunk and leaves have detail slices (draw_tree used 10)"""
+    trunk = transform(cylinder(0.3, 3.0, detail, 2), rotation(-90, 1, 0, 0))
+    leaves = transform(sphere(1.5, detail, detail), translation(0, 3.0, 0))
+    return np.concatenate([colored(trunk, (0.4, 0.2, 0.1)), colored(leaves, (0.1, 0.7, 0.2))])
+
+
+def house_body():
+    return transform(box(1.0, 1.0, 1.0), translation(0, house_height / 2, 0),
+                     scaling(house_width, house_height, house_depth))
+
+
+def house_roof():
+    return transform(cone(house_width / 2 * 1.7, 1.5 * house_scale, 16, 16),
+                     translation(0, house_height, 0), rotation(-90, 1, 0, 0))
+
+
+def house_door():
+    return transform(box(1.0, 1.0, 1.0), translation(0, 0.5 * house_scale, house_depth / 2 + 0.01),
+                     scaling(0.6 * house_scale, 1.2 * house_scale, 0.1))
+
+
+def house_windows():
+    return np.concatenate([
+        transform(box(1.0, 1.0, 1.0), translation(x_pos, y_pos, house_depth / 2 + 0.01),
+                  scaling(0.6 * house_scale, 0.5 * house_scale, 0.1))
+        for x_pos, y_pos in house_window_positions
+    ])
+
+
+def house():
+    """All house parts in one white mesh, with the row range of each part.
+
+    The ranges are keyed like a house appearance from simulation.house_appearance(),
+    so each house's colors can be painted straight onto a copy of the mesh.
+    """
+    parts = [("body", house_body()), ("roof", house_roof()), ("door", house_door()), ("windows", house_windows())]
+    ranges = {}
+    first = 0
+    for name, part in parts:
+        ranges[name] = (first, first + len(part))
+        first += len(part)
+    return colored(np.concatenate([part for _, part in parts]), (1.0, 1.0, 1.0)), ranges
+
+
+def house_billboard():
+    """Far-away stand-in for a house: its front wall and roof outline as flat shapes, in house()'s colors"""
+    w = house_width / 2
+    roof = house_width / 2 * 1.7
+    front = house_depth / 2
+    normal = (0.0, 0.0, 1.0)
+    body = [(-w, 0, front), (w, 0, front), (w, house_height, front),
+            (-w, 0, front), (w, house_height, front), (-w, house_height, front)]
+    top = [(-roof, house_height, front), (roof, house_height, front), (0, house_height + 1.5 * house_scale, front)]
+    mesh = colored(np.array([corner + normal for corner in body + top], dtype=np.float32), (1.0, 1.0, 1.0))
+    return mesh, {"body": (0, len(body)), "roof": (len(body), len(body) + len(top))}
+
+
+builders = {
+    "car_wheels": car_wheels,
+    "car_lower": car_lower,
+    "car_upper": car_upper,
+    "player_car": player_car,
+}
@@ -0,0 +1,121 @@
+"""OpenGL context with no window, for rendering on machines without a display.
+
+The context comes from EGL with a small pbuffer surface (Mesa's surfaceless
+platform when no display server is around), so it works with llvmpipe on a
+render server as well as with a GPU driver. FrameCapture renders into a
+framebuffer object and reads the frames back without stalling.
+
+PyOpenGL picks its platform when OpenGL is first imported, so this module has
+to be imported before anything that imports OpenGL.
+"""
+import ctypes
+import os
+
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+import glconfig  # noqa: F401
+from OpenGL import EGL
+from OpenGL.GL import *
+import numpy as np
+
+
+def create_context(width, height):
+    """Create an OpenGL context with a width x height surface and make it current"""
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise RuntimeError("could not initialize an EGL display")
+
+    attributes = (EGL.EGLint * 13)(
+        EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+        EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+        EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+        EGL.EGL_DEPTH_SIZE, 24,
+        EGL.EGL_NONE)
+    config = EGL.EGLConfig()
+    found = EGL.EGLint()
+    EGL.eglChooseConfig(display, attributes, ctypes.pointer(config), 1, ctypes.pointer(found))
+    if not found.value:
+        raise RuntimeError("no EGL config supports desktop OpenGL with a depth buffer")
+
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    size = (EGL.EGLint * 5)(EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE)
+    surface = EGL.eglCreatePbufferSurface(display, config, size)
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError("could not make the EGL context current")
+    return display, surface, context
+
+
+class FrameCapture:
+    """A framebuffer object to render into, read back through two pixel buffer objects.
+
+    read() starts copying the frame just drawn into one buffer and returns the
+    frame started on the call before from the other, so glReadPixels only queues
+    the copy and never waits for the GPU to finish drawing. Frames come back one
+    call late as top-to-bottom RGB bytes; finish() returns the last one.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+
+        self.framebuffer = glGenFramebuffers(1)
+        self.renderbuffers = glGenRenderbuffers(2)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        for renderbuffer, storage, attachment in zip(self.renderbuffers, (GL_RGBA8, GL_DEPTH24_STENCIL8),
+                                                     (GL_COLOR_ATTACHMENT0, GL_DEPTH_STENCIL_ATTACHMENT)):
+            glBindRenderbuffer(GL_RENDERBUFFER, renderbuffer)
+            glRenderbufferStorage(GL_RENDERBUFFER, storage, width, height)
+            glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, renderbuffer)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+
+        self.pixel_buffers = glGenBuffers(2)
+        for pixel_buffer in self.pixel_buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pixel_buffer)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.frame_size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.next = 0
+        self.pending = False
+
+    def bind(self):
+        """Direct drawing into the capture framebuffer"""
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+
+    def read(self):
+        """Start reading back the current frame; return the previous one, or None on the first call"""
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.framebuffer)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pixel_buffers[self.next])
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+
+        self.next = 1 - self.next
+        previous = self._map(self.pixel_buffers[self.next]) if self.pending else None
+        self.pending = True
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return previous
+
+    def finish(self):
+        """The frame still being read back, or None if there is none"""
+        if not self.pending:
+            return None
+        self.pending = False
+        frame = self._map(self.pixel_buffers[1 - self.next])
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return frame
+
+    def _map(self, pixel_buffer):
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pixel_buffer)
+        address = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        pixels = np.ctypeslib.as_array((ctypes.c_ubyte * self.frame_size).from_address(address))
+        # GL rows start at the bottom of the image
+        frame = pixels.reshape(self.height, self.width * 3)[::-1].tobytes()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        return frame
+
+    def release(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glDeleteFramebuffers(1, [self.framebuffer])
+        glDeleteRenderbuffers(2, self.renderbuffers)
+        glDeleteBuffers(2, self.pixel_buffers)
@@ -0,0 +1,110 @@
+"""Per-phase frame timing.
+
+A FrameProfiler measures named phases of a frame, either with
+`with profiler.phase(name):` around a block or by wrapping functions with
+instrument(). Phases may nest (update_car calls update_road_segments); each
+phase is charged only its own time, not that of the phases inside it.
+
+end_frame() closes a frame: its phase times go into a ring of the last window
+frames, from which stats() gives the rolling average and 99th percentile, and
+into the CSV log if one is open (one row per frame, times in milliseconds).
+"""
+import csv
+import functools
+import time
+
+import numpy as np
+
+
+class _Phase:
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.begin(self.name)
+
+    def __exit__(self, *exc):
+        self.profiler.end()
+
+
+class FrameProfiler:
+    def __init__(self, phases, window=240):
+        self.phases = list(phases)
+        self.columns = {name: i for i, name in enumerate(self.phases)}
+        # One row per frame: the phase times, then the whole frame
+        self.samples = np.zeros((window, len(self.phases) + 1))
+        self.current = np.zeros(len(self.phases))
+        self.frames = 0
+        self.stack = []
+        self.frame_start = time.perf_counter()
+        self.log_file = None
+        self.log = None
+
+    def begin(self, name):
+        self.stack.append([name, time.perf_counter(), 0.0])
+
+    def end(self):
+        name, start, nested = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        self.current[self.columns[name]] += elapsed - nested
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def wrap(self, func, name=None):
+        """func, timed as the phase name (its own name by default) on every call"""
+        name = name or func.__name__
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            self.begin(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.end()
+        return timed
+
+    def instrument(self, module, names):
+        """Replace the module's functions with timed ones, so calls between them are timed too"""
+        for name in names:
+            setattr(module, name, self.wrap(getattr(module, name), name))
+
+    def end_frame(self):
+        now = time.perf_counter()
+        row = self.samples[self.frames % len(self.samples)]
+        row[:-1] = self.current
+        row[-1] = now - self.frame_start
+        self.frames += 1
+        self.frame_start = now
+        self.current[:] = 0.0
+
+        if self.log is not None:
+            self.log.writerow([self.frames] + [f"{t * 1000:.4f}" for t in row])
+
+    def stats(self):
+        """{phase: (average ms, p99 ms)} over the recent frames, with the whole frame under "frame" """
+        recent = self.samples[:min(self.frames, len(self.samples))]
+        if not len(recent):
+            return {}
+        averages = recent.mean(axis=0) * 1000
+        p99 = np.percentile(recent, 99, axis=0) * 1000
+        names = self.phases + ["frame"]
+        return {name: (averages[i], p99[i]) for i, name in enumerate(names)}
+
+    def open_log(self, path):
+        self.close_log()
+        # Line buffered, so the rows are on disk even if GLUT exits the process
+        self.log_file = open(path, "w", newline="", buffering=1)
+        self.log = csv.writer(self.log_file)
+        self.log.writerow(["frame"] + self.phases + ["frame_ms"])
+
+    def close_log(self):
+        if self.log_file is not None:
+            self.log_file.close()
+        self.log_file = None
+        self.log = None
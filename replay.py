@@ -0,0 +1,121 @@
+"""Recording games and replaying them headlessly.
+
+A game is fully determined by its seed and the controls held on every tick, so
+a recording is just those: a header, then one byte per tick holding the INPUT_*
+bits from simulation.py, plus INPUT_RESTART on the first tick after the player
+restarted. The header also keeps the score, game_over and car position the
+game ended with, so a replay can check that it reproduced them exactly.
+
+    python replay.py session.replay [...]
+
+plays recordings back at full speed and exits with status 1 if any of them
+ends differently from the recorded game.
+"""
+import argparse
+import struct
+import sys
+import time
+
+from simulation import Inputs, new_game, restart_game, step
+
+INPUT_RESTART = 16
+
+magic = b"HWRP"
+# Bumped whenever the simulation changes, since old recordings would play out differently
+version = 5
+# magic, version, seed, tick count, then the final score, game_over, car_x and car_z
+header = struct.Struct("<4sBQIq?dd")
+
+# One shared Inputs for every combination of bits
+tick_inputs = [Inputs.from_bits(bits) for bits in range(16)]
+
+
+class Replay:
+    def __init__(self, seed, ticks, score, game_over, car_x, car_z):
+        self.seed = seed
+        self.ticks = bytes(ticks)
+        self.score = score
+        self.game_over = game_over
+        self.car_x = car_x
+        self.car_z = car_z
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        tag, file_version, seed, count, score, game_over, car_x, car_z = header.unpack_from(data)
+        if tag != magic or file_version != version:
+            raise ValueError(f"{path} is not a version {version} replay")
+        ticks = data[header.size:header.size + count]
+        if len(ticks) != count:
+            raise ValueError(f"{path} is truncated")
+        return cls(seed, ticks, score, game_over, car_x, car_z)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(header.pack(magic, version, self.seed, len(self.ticks), self.score, self.game_over,
+                                self.car_x, self.car_z))
+            f.write(self.ticks)
+
+    def play(self, state=None):
+        """Run the recorded game from the start (into state, if given) and return its final state"""
+        if state is None:
+            state = new_game(self.seed)
+        for bits in self.ticks:
+            if bits & INPUT_RESTART:
+                restart_game(state)
+            step(state, tick_inputs[bits & 15])
+        return state
+
+    def matches(self, state):
+        return (state.score == self.score and state.game_over == self.game_over
+                and state.car_x == self.car_x and state.car_z == self.car_z)
+
+
+class Recorder:
+    """Collects the inputs of a game as it is played"""
+    def __init__(self, seed):
+        self.seed = seed
+        self.ticks = bytearray()
+        self.restarted = False
+
+    def restart(self):
+        """Note that the game was restarted before the next tick"""
+        self.restarted = True
+
+    def record(self, inputs):
+        """Note the inputs of the tick about to be stepped"""
+        bits = inputs.to_bits()
+        if self.restarted:
+            bits |= INPUT_RESTART
+            self.restarted = False
+        self.ticks.append(bits)
+
+    def replay(self, state):
+        """The recording so far, ending in state"""
+        return Replay(self.seed, self.ticks, state.score, state.game_over, state.car_x, state.car_z)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded games and check they end the same way")
+    parser.add_argument("replays", nargs="+", metavar="REPLAY")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.replays:
+        replay = Replay.load(path)
+        begin = time.perf_counter()
+        state = replay.play()
+        elapsed = time.perf_counter() - begin
+        same = replay.matches(state)
+        failed = failed or not same
+        print(f"{path}: {len(replay.ticks)} ticks at {len(replay.ticks) / max(elapsed, 1e-9):.0f}/s, "
+              f"score {state.score} (recorded {replay.score}), game over {state.game_over} "
+              f"(recorded {replay.game_over}), car at ({state.car_x:.3f}, {state.car_z:.3f}) "
+              f"(recorded ({replay.car_x:.3f}, {replay.car_z:.3f})) {'OK' if same else 'MISMATCH'}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""The road as one persistent vertex buffer.
+
+Every slot of the simulation's road_segments ring owns a fixed range of the
+buffer holding that segment's asphalt, both borders and its lane stripes. When
+the simulation recycles a segment only that slot's range is rewritten, and the
+whole road is drawn with a single call, so the per-frame cost doesn't depend on
+how many segments there are.
+"""
+import math
+
+import numpy as np
+
+from geometry import VertexBuffer
+from simulation import road_width, road_segment_length
+
+asphalt_color = (0.2, 0.2, 0.2)
+border_color = (0.5, 0.5, 0.5)
+stripe_color = (1.0, 1.0, 1.0)
+border_width = 0.5
+border_height = 0.5
+stripe_length = 3.0
+gap_length = 3.0
+stripe_width = 0.3
+
+# Enough stripe quads for any segment; stripes are laid out on a fixed grid of
+# world z, so they line up across segment boundaries
+stripes_per_segment = int(math.ceil(road_segment_length / (stripe_length + gap_length))) + 1
+
+
+def _quad(corners, normal, color):
+    """Two triangles for a quad given as four (x, y, z) corners"""
+    a, b, c, d = corners
+    return [corner + normal + color for corner in (a, b, c, a, c, d)]
+
+
+def _segment_template():
+    """Asphalt and border triangles of a segment starting at z=0, with z scaled to 0..1"""
+    w = road_width / 2
+    rows = []
+    rows += _quad([(-w, 0.01, 0), (-w, 0.01, 1), (w, 0.01, 1), (w, 0.01, 0)], (0, 1, 0), asphalt_color)
+    for side in (-1, 1):
+        outer = side * (w + border_width)
+        inner = side * w
+        rows += _quad([(outer, 0.0, 0), (outer, border_height, 0), (outer, border_height, 1), (outer, 0.0, 1)],
+                      (side, 0, 0), border_color)
+        rows += _quad([(outer, border_height, 0), (inner, border_height, 0), (inner, border_height, 1), (outer, border_height, 1)],
+                      (0, 1, 0), border_color)
+        rows += _quad([(inner, border_height, 0), (inner, 0.0, 0), (inner, 0.0, 1), (inner, border_height, 1)],
+                      (-side, 0, 0), border_color)
+    return np.array(rows, dtype=np.float32)
+
+
+def _stripe_template():
+    """One stripe quad with z scaled to 0..1"""
+    s = stripe_width / 2
+    return np.array(_quad([(-s, 0.02, 0), (-s, 0.02, 1), (s, 0.02, 1), (s, 0.02, 0)], (0, 1, 0), stripe_color),
+                    dtype=np.float32)
+
+
+class RoadMesh:
+    def __init__(self):
+        self.segment = _segment_template()
+        self.stripe = _stripe_template()
+        self.vertices_per_segment = len(self.segment) + stripes_per_segment * len(self.stripe)
+        self.buffer = VertexBuffer()
+        self.source = None
+
+    def segment_vertices(self, starts):
+        """Vertices for segments starting at each z in starts, shape (len(starts), vertices_per_segment, 9)"""
+        starts = np.asarray(starts, dtype=np.float64)
+        count = len(starts)
+
+        body = np.repeat(self.segment[None], count, axis=0)
+        body[:, :, 2] = starts[:, None] + body[:, :, 2] * road_segment_length
+
+        # Clip the stripe grid to each segment; stripes that fall outside collapse to nothing
+        period = stripe_length + gap_length
+        first = np.floor(starts / period) * period
+        stripe_start = first[:, None] + period * np.arange(stripes_per_segment)[None, :]
+        stripe_end = np.minimum(stripe_start + stripe_length, starts[:, None] + road_segment_length)
+        stripe_start = np.maximum(stripe_start, starts[:, None])
+        stripe_end = np.maximum(stripe_end, stripe_start)
+
+        stripes = np.repeat(np.repeat(self.stripe[None, None], count, axis=0), stripes_per_segment, axis=1)
+        unit = stripes[:, :, :, 2]
+        stripes[:, :, :, 2] = stripe_start[:, :, None] + unit * (stripe_end - stripe_start)[:, :, None]
+
+        return np.concatenate([body, stripes.reshape(count, -1, 9)], axis=1)
+
+    def sync(self, state):
+        """Rewrite the slots of segments the simulation recycled since the last frame"""
+        if state.road_segments is not self.source or self.buffer.count != len(state.road_segments) * self.vertices_per_segment:
+            self.source = state.road_segments
+            self.buffer.upload(self.segment_vertices(state.road_segments))
+        else:
+            for slot in state.changed_road_segments:
+                self.buffer.update(slot * self.vertices_per_segment, self.segment_vertices([state.road_segments[slot]]))
+        state.changed_road_segments.clear()
+
+    def draw(self, state):
+        self.sync(state)
+        self.buffer.draw()
@@ -0,0 +1,50 @@
+"""Deterministic roadside scenery, generated a chunk of road at a time.
+
+The roadside is cut into chunks of chunk_length along z, numbered from 0 at the
+start of the road and counting up in the driving direction (-z). What a chunk
+holds depends only on the world seed and the chunk's number, through its own
+random.Random seeded by chunk_seed(), so a chunk comes out the same whenever
+and in whatever order it is generated. ChunkCache keeps the most recently used
+chunks so ones that come back into range are not generated again.
+"""
+import math
+from collections import OrderedDict
+
+chunk_length = 20.0
+cache_size = 64
+
+mask64 = (1 << 64) - 1
+
+
+def chunk_index(z):
+    """Number of the chunk containing z"""
+    return math.floor(-z / chunk_length)
+
+
+def chunk_seed(seed, chunk):
+    """Well mixed 64 bit seed for one chunk of a world (splitmix64 of the pair)"""
+    value = (seed + 0x9E3779B97F4A7C15 * (chunk + 1)) & mask64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & mask64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & mask64
+    return value ^ (value >> 31)
+
+
+class ChunkCache:
+    """The last size chunks made by generate(chunk), least recently used dropped first"""
+    def __init__(self, generate, size=cache_size):
+        self.generate = generate
+        self.size = size
+        self.chunks = OrderedDict()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def get(self, chunk):
+        contents = self.chunks.get(chunk)
+        if contents is None:
+            contents = self.chunks[chunk] = self.generate(chunk)
+            if len(self.chunks) > self.size:
+                self.chunks.popitem(last=False)
+        else:
+            self.chunks.move_to_end(chunk)
+        return contents
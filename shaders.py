@@ -0,0 +1,151 @@
+"""Optional shader renderer for the scene (--shaders).
+
+The scene is drawn by one GLSL program instead of the fixed-function pipeline.
+Vertex buffers feed generic attributes 0-2 (position, normal, color), each
+object's transform and color are uniforms, and every vertex is lit the way
+GL_LIGHT0 and the material from init() light it. The shaders are GLSL 3.30
+core, but they run in the game's ordinary compatibility context, so the HUD
+still draws with the fixed-function pipeline.
+
+CPU traffic has a program of its own that draws every car in one instanced
+call (instancing.TrafficInstances). It lights cars exactly as the fixed-function
+pipeline does, so it is used whenever OpenGL 3.3 is available, with or without
+--shaders.
+"""
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileProgram, compileShader
+import numpy as np
+
+import geometry
+
+# GL_LIGHT0 as init() sets it up: a white point light at (0, 20, 0) in eye
+# space, 0.2 ambient from the light plus 0.2 from the light model, 0.8 diffuse
+# and a white highlight of shininess 50 seen from infinitely far away
+lighting_source = """
+const vec3 light_position = vec3(0.0, 20.0, 0.0);
+const float ambient = 0.4;
+const float diffuse = 0.8;
+const float shininess = 50.0;
+
+vec3 light(vec3 eye, vec3 normal, vec3 color) {
+    vec3 n = normalize(normal);
+    vec3 l = normalize(light_position - eye);
+    float lambert = max(dot(n, l), 0.0);
+    float specular = 0.0;
+    if (lambert > 0.0)
+        specular = pow(max(dot(n, normalize(l + vec3(0.0, 0.0, 1.0))), 0.0), shininess);
+    return min(color * (ambient + diffuse * lambert) + specular, 1.0);
+}
+"""
+
+vertex_source = """
+#version 330 core
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec3 normal;
+layout(location = 2) in vec3 color;
+
+uniform mat4 projection;
+uniform mat4 view;
+uniform mat4 model;
+uniform vec3 tint;
+
+out vec3 lit_color;
+""" + lighting_source + """
+void main() {
+    mat4 modelview = view * model;
+    vec4 eye = modelview * vec4(position, 1.0);
+    lit_color = light(eye.xyz, mat3(modelview) * normal, color * tint);
+    gl_Position = projection * eye;
+}
+"""
+
+# CPU cars, one instance each: the car mesh moved to the car's (x, z), with the
+# lower body in the car's color and the upper body in a lighter shade of it
+traffic_vertex_source = """
+#version 330 core
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec3 normal;
+layout(location = 2) in vec3 color;
+layout(location = 3) in vec2 offset;
+layout(location = 4) in vec3 body_color;
+
+uniform mat4 projection;
+uniform mat4 view;
+uniform int upper_first;
+uniform int wheels_first;
+
+out vec3 lit_color;
+""" + lighting_source + """
+void main() {
+    vec3 tint = vec3(1.0);
+    if (gl_VertexID < upper_first)
+        tint = body_color;
+    else if (gl_VertexID < wheels_first)
+        tint = min(body_color + 0.6, 1.0);
+    vec4 eye = view * vec4(position + vec3(offset.x, 0.5, offset.y), 1.0);
+    lit_color = light(eye.xyz, mat3(view) * normal, color * tint);
+    gl_Position = projection * eye;
+}
+"""
+
+fragment_source = """
+#version 330 core
+in vec3 lit_color;
+out vec4 fragment_color;
+
+void main() {
+    fragment_color = vec4(lit_color, 1.0);
+}
+"""
+
+identity = np.identity(4, dtype=np.float32)
+white = (1.0, 1.0, 1.0)
+
+
+def compile_program(vertex):
+    """Link a vertex shader's source with the shared fragment shader"""
+    return compileProgram(compileShader(vertex, GL_VERTEX_SHADER),
+                          compileShader(fragment_source, GL_FRAGMENT_SHADER))
+
+
+def supported():
+    """Whether the current context can run GLSL 3.30"""
+    major, minor = (int(part) for part in glGetString(GL_VERSION).split()[0].split(b".")[:2])
+    return (major, minor) >= (3, 3)
+
+
+class ShaderPipeline:
+    def __init__(self):
+        self.program = None
+        self.uniforms = {}
+
+    def build(self):
+        self.program = compile_program(vertex_source)
+        for name in ("projection", "view", "model", "tint"):
+            self.uniforms[name] = glGetUniformLocation(self.program, name)
+
+    def begin(self, frustum):
+        """Draw everything that follows with the program, through the frustum's camera"""
+        glUseProgram(self.program)
+        glUniformMatrix4fv(self.uniforms["projection"], 1, GL_TRUE, frustum.projection.astype(np.float32))
+        glUniformMatrix4fv(self.uniforms["view"], 1, GL_TRUE, frustum.view.astype(np.float32))
+        self.transform(identity)
+        self.tint(white)
+        geometry.use_attributes = True
+
+    def transform(self, matrix):
+        """Model matrix of the following draws, row-major like meshes.translation()"""
+        glUniformMatrix4fv(self.uniforms["model"], 1, GL_TRUE, np.asarray(matrix, dtype=np.float32))
+
+    def tint(self, color):
+        """Color the following draws' vertex colors are multiplied by"""
+        glUniform3f(self.uniforms["tint"], *color)
+
+    def end(self):
+        geometry.use_attributes = False
+        glUseProgram(0)
+
+    def release(self):
+        if self.program is not None:
+            glDeleteProgram(self.program)
+        self.program = None
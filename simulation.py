@@ -0,0 +1,461 @@
+"""Headless game simulation for the highway car game.
+
+Everything here is plain Python: no OpenGL, no GLUT and no module-level game
+state. A GameState holds one game and step() advances it by one tick, so the
+simulation can run without a window for load testing and CI.
+
+All of a game's randomness comes from its seed: traffic from its own
+random.Random, scenery from chunks hashed from the seed and their position. A
+seed and the inputs of every tick replay a game exactly.
+"""
+import math
+import random
+
+import numpy as np
+
+from collision import collide_one, player_boxes, player_reach, rear_end_box, window
+from driving import drive, drive_lists, few_cars, max_acceleration
+from scenery import ChunkCache, chunk_index, chunk_length, chunk_seed, mask64
+from spatial import TrafficIndex
+from traffic import TrafficStore
+
+# Car
+max_speed = 0.5
+max_reverse_speed = -0.1
+acceleration = 0.001
+deceleration = 0.001
+turning_speed = 0.2
+max_turn_angle = 90.0
+wheel_offset = 0.6
+
+#road
+road_width = 10.0
+road_segment_length = 20.0
+num_road_segments = 10
+
+#traffic, which spawns at spawn_speed and then drives at its own desired speed
+spawn_speed = 0.2
+min_desired_speed = 0.15
+max_desired_speed = 0.25
+# Give up on spawning a car after this many overlapping tries in a tick
+max_spawn_attempts = 32
+# Traffic this far ahead of or behind the player car has left the road
+traffic_range = 150
+
+#environment, generated in chunks of chunk_length (see scenery.py)
+num_scenery_chunks = 10
+trees_per_chunk = 12
+houses_per_chunk = 2
+
+
+# Input bits, for code that stores or batches controls as integers
+INPUT_FORWARD = 1
+INPUT_BACKWARD = 2
+INPUT_LEFT = 4
+INPUT_RIGHT = 8
+
+
+class Inputs:
+    """Driver controls held down during a tick"""
+    def __init__(self, move_forward=False, move_backward=False, turn_left=False, turn_right=False):
+        self.move_forward = move_forward
+        self.move_backward = move_backward
+        self.turn_left = turn_left
+        self.turn_right = turn_right
+
+    @classmethod
+    def from_bits(cls, bits):
+        return cls(bool(bits & INPUT_FORWARD), bool(bits & INPUT_BACKWARD),
+                   bool(bits & INPUT_LEFT), bool(bits & INPUT_RIGHT))
+
+    def to_bits(self):
+        bits = 0
+        if self.move_forward:
+            bits |= INPUT_FORWARD
+        if self.move_backward:
+            bits |= INPUT_BACKWARD
+        if self.turn_left:
+            bits |= INPUT_LEFT
+        if self.turn_right:
+            bits |= INPUT_RIGHT
+        return bits
+
+
+class GameState:
+    """Complete state of one game"""
+    def __init__(self, seed=None):
+        # Kept to 64 bits, the size snapshots and replays store it in
+        self.seed = random.getrandbits(64) if seed is None else seed & mask64
+        self.rng = random.Random(self.seed)
+
+        # Car
+        self.car_x = 0.0
+        self.car_y = 0.0
+        self.car_z = 0.0
+        self.car_rotation = 0.0
+        self.car_speed = 0.0
+
+        self.game_over = False
+        self.score = 0
+
+        # Road segments and environment objects. road_segments is a ring buffer
+        # of segment start z values; road_head is the slot of the segment nearest
+        # the start of the road, which is the next one to be recycled.
+        self.road_segments = []
+        self.road_head = 0
+        self.changed_road_segments = set()
+        self.trees = []
+        self.houses = []
+        self.house_colors = []
+
+        # Indices of trees and houses moved since a renderer last looked
+        self.changed_trees = set()
+        self.changed_houses = set()
+        # Trees and houses hold num_scenery_chunks chunks of scenery from
+        # scenery_chunk on, chunk c in the slots of c % num_scenery_chunks
+        self.scenery_chunk = None
+        self.scenery = ChunkCache(lambda chunk: generate_chunk(self.seed, chunk))
+
+        self.cpu_cars = TrafficStore()
+        # cpu_cars slots sorted by z, rebuilt every time the traffic moves
+        self.traffic_index = TrafficIndex()
+        self.cpu_spawn_timer = 100
+        self.cpu_spawn_interval = 250
+        self.num_cars = 1
+
+
+def new_game(seed=None):
+    """Create a freshly started game; without a seed, a random one is picked and kept in state.seed"""
+    state = GameState(seed)
+    restart_game(state)
+    return state
+
+
+def restart_game(state):
+    state.car_x = 0.0
+    state.car_y = 0.0
+    state.car_z = 0.0
+    state.car_rotation = 0.0
+    state.car_speed = 0.0
+    state.game_over = False
+    state.score = 0
+
+    state.cpu_spawn_timer = 0
+
+    #road environment
+    generate_road_segments(state)
+    generate_environment_objects(state)
+
+
+def generate_road_segments(state):
+    state.road_segments = []
+    state.road_head = 0
+    state.changed_road_segments = set()
+
+    for i in range(num_road_segments):
+        z_pos = -i * road_segment_length
+        state.road_segments.append(z_pos)
+
+
+def house_appearance(rng):
+    """Roll the colors of one house: its walls, door, windows and roof"""
+    return {
+        "body": [rng.uniform(0.2, 1.0), rng.uniform(0.2, 1.0), rng.uniform(0.2, 1.0)],
+        "door": [rng.uniform(0.2, 0.5), rng.uniform(0.1, 0.3), rng.uniform(0.0, 0.1)],
+        "windows": [rng.uniform(0.4, 0.8), rng.uniform(0.6, 0.9), rng.uniform(0.7, 1.0)],
+        "roof": [0.6, 0.2, 0.1],
+    }
+
+
+def generate_chunk(seed, chunk):
+    """Trees, houses and house colors of one chunk of roadside"""
+    rng = random.Random(chunk_seed(seed, chunk))
+    near_z = -chunk * chunk_length
+
+    trees = []
+    for _ in range(trees_per_chunk):
+        side = rng.choice([-1, 1])
+        x = side * (road_width / 2 + 2 + rng.uniform(0.5, 3))
+        z = near_z - rng.uniform(0, chunk_length)
+        scale = rng.uniform(1.5, 3.0)
+        trees.append((x, z, scale))
+
+    # One house on each side of the road
+    houses = []
+    colors = []
+    for side in (-1, 1):
+        x = side * (road_width / 2 + 10 + rng.uniform(2, 7))
+        z = near_z - rng.uniform(0, chunk_length)
+        house_type = rng.randint(0, 2)
+        houses.append((x, z, house_type))
+        colors.append(house_appearance(rng))
+    return trees, houses, colors
+
+
+def generate_environment_objects(state):
+    state.trees = [None] * (num_scenery_chunks * trees_per_chunk)
+    state.houses = [None] * (num_scenery_chunks * houses_per_chunk)
+    state.house_colors = [None] * (num_scenery_chunks * houses_per_chunk)
+    state.changed_trees = set()
+    state.changed_houses = set()
+    state.scenery_chunk = None
+    update_environment_objects(state)
+
+
+def place_chunk(state, chunk):
+    """Fill the chunk's slots in trees, houses and house_colors"""
+    trees, houses, colors = state.scenery.get(chunk)
+    slot = chunk % num_scenery_chunks
+
+    first = slot * trees_per_chunk
+    for i, tree in enumerate(trees, first):
+        state.trees[i] = list(tree)
+    state.changed_trees.update(range(first, first + trees_per_chunk))
+
+    first = slot * houses_per_chunk
+    for i, (house, appearance) in enumerate(zip(houses, colors), first):
+        state.houses[i] = list(house)
+        state.house_colors[i] = appearance
+    state.changed_houses.update(range(first, first + houses_per_chunk))
+
+
+def update_environment_objects(state):
+    # The scenery spans num_scenery_chunks chunks, starting with the one just
+    # behind the car
+    first = chunk_index(state.car_z + road_segment_length * 2)
+    previous = state.scenery_chunk
+    if first == previous:
+        return
+
+    if previous is None or abs(first - previous) >= num_scenery_chunks:
+        entering = range(first, first + num_scenery_chunks)
+    elif first > previous:
+        entering = range(previous + num_scenery_chunks, first + num_scenery_chunks)
+    else:
+        entering = range(first, previous)
+    for chunk in entering:
+        place_chunk(state, chunk)
+    state.scenery_chunk = first
+
+
+def update_road_segments(state):
+    segments = state.road_segments
+    count = len(segments)
+    head = state.road_head
+    furthest_segment = segments[head - 1]
+
+    if state.car_z < furthest_segment + (count - 5) * road_segment_length:
+        # The nearest segment's slot becomes the new furthest segment
+        segments[head] = furthest_segment - road_segment_length
+        state.changed_road_segments.add(head)
+        state.road_head = (head + 1) % count
+
+        state.score += 1
+
+    update_environment_objects(state)
+
+
+def update_car(state, inputs):
+    if not state.game_over:
+        angle_rad = math.radians(state.car_rotation)
+
+        #car movement logics
+        if inputs.move_forward:
+            state.car_speed += acceleration
+            if state.car_speed > max_speed:
+                state.car_speed = max_speed
+        elif inputs.move_backward:
+            if state.car_speed > 0:
+                state.car_speed -= acceleration
+                if state.car_speed < 0:
+                    state.car_speed = 0
+        else:
+            if state.car_speed > 0:
+                state.car_speed -= deceleration
+                if state.car_speed < 0:
+                    state.car_speed = 0
+            elif state.car_speed < 0:
+                state.car_speed = 0
+
+        if abs(state.car_speed) > 0.05:
+            if inputs.turn_left:
+                state.car_rotation += turning_speed * (abs(state.car_speed) / max_speed)
+                if state.car_rotation > max_turn_angle:
+                    state.car_rotation = max_turn_angle
+            if inputs.turn_right:
+                state.car_rotation -= turning_speed * (abs(state.car_speed) / max_speed)
+                if state.car_rotation < -max_turn_angle:
+                    state.car_rotation = -max_turn_angle
+
+        #carmovement
+        start_x = state.car_x
+        start_z = state.car_z
+        if state.car_speed != 0:
+            state.car_x += state.car_speed * math.sin(-angle_rad)
+            state.car_z -= state.car_speed * math.cos(-angle_rad)
+
+        car_x = state.car_x
+        car_z = state.car_z
+        if abs(car_x - wheel_offset) > road_width / 2 or abs(car_x + wheel_offset) > road_width / 2:
+            state.game_over = True
+
+        #collision check: running into a CPU car, or lining the wheels up with
+        #one, at any point of the move, with the traffic where it ended its own move
+        traffic = state.cpu_cars
+        for i in state.traffic_index.near(*window(start_z, car_z, player_reach)).tolist():
+            cpu_x = traffic.x[i]
+            cpu_z = traffic.z[i]
+            for box in player_boxes:
+                if collide_one(cpu_x, cpu_z, cpu_x, cpu_z, start_x, start_z, car_x, car_z, box):
+                    state.game_over = True
+
+        update_road_segments(state)
+
+
+def update_cpu_cars(state):
+    # Adjust CPU car spawn interval based on the score
+    score = state.score
+    if score < 5000:
+        state.cpu_spawn_interval = 350
+    elif score < 10000:
+        state.cpu_spawn_interval = 300
+    elif score < 15000:
+        state.cpu_spawn_interval = 250
+    else:
+        state.cpu_spawn_interval = 180
+
+    # Start with fewer CPU cars and increment slower
+    if score < 10000:
+        state.num_cars = 1 + (score // 5000)
+        if state.num_cars > 2:
+            state.num_cars = 2
+    else:
+        state.num_cars = 2
+
+    traffic = state.cpu_cars
+    index = state.traffic_index
+    if index.count != len(traffic):
+        index.rebuild(traffic)
+
+    state.cpu_spawn_timer += 1
+    if state.cpu_spawn_timer >= state.cpu_spawn_interval:
+        state.cpu_spawn_timer = 0
+
+        lanes = [-road_width / 4, 0, road_width / 4]
+        rng = state.rng
+
+        for _ in range(state.num_cars):
+            # Traffic can back up to the spawn point, so give up on a car
+            # rather than search forever for a free spot
+            for _ in range(max_spawn_attempts):
+                spawn_x = rng.choice(lanes) + rng.uniform(-1.0, 1.0)
+                spawn_z = state.car_z - 80
+                color = (rng.uniform(0.0, 1.0), rng.uniform(0.0, 1.0), rng.uniform(0.0, 1.0))
+                desired_speed = rng.uniform(min_desired_speed, max_desired_speed)
+
+                min_distance = 1.5
+                overlap = False
+                for i in index.near(spawn_z, min_distance):
+                    distance = math.sqrt((spawn_x - traffic.x[i]) ** 2 + (spawn_z - traffic.z[i]) ** 2)
+                    if distance < min_distance:
+                        overlap = True
+                        break
+
+                if not overlap:
+                    traffic.append(spawn_x, spawn_z, spawn_speed, color, desired_speed=desired_speed)
+                    index.rebuild(traffic)
+                    break
+
+    # Traffic follows the car ahead, changes lanes, and keeps out of the player's way
+    forward_speed = state.car_speed * math.cos(math.radians(state.car_rotation))
+    if traffic.count <= few_cars:
+        move_few_cpu_cars(state, forward_speed)
+    else:
+        move_cpu_cars(state, forward_speed)
+    index.rebuild(traffic)
+
+
+def move_cpu_cars(state, forward_speed):
+    """Drive the traffic one tick, then check it for crashes into the player, overtakes and cars that left"""
+    traffic = state.cpu_cars
+    car_x = state.car_x
+    car_z = state.car_z
+    count = traffic.count
+
+    # The cars that can meet the player during the traffic's move: none moves
+    # further than its speed plus a tick's acceleration (and a margin for rounding)
+    slots = state.traffic_index.near(*window(car_z, car_z, rear_end_box,
+                                             traffic.speed[:count].max() + 2 * max_acceleration)).tolist()
+    start = [(traffic.x[i], traffic.z[i]) for i in slots]
+
+    drive(traffic.x[:count], traffic.z[:count], traffic.speed[:count], traffic.target_x[:count],
+          traffic.desired_speed[:count], np.zeros(count, dtype=np.int64),
+          np.array([car_x]), np.array([car_z]), np.array([forward_speed]))
+    z = traffic.z[:count]
+
+    # Running into a CPU car ahead, at any point of the traffic's move
+    for i, (start_x, start_z) in zip(slots, start):
+        if collide_one(start_x, start_z, traffic.x[i], traffic.z[i], car_x, car_z, car_x, car_z, rear_end_box):
+            state.game_over = True
+
+    overtaken = traffic.overtaken[:count]
+    passed = (z > car_z) & ~overtaken
+    if passed.any():
+        state.score += 100 * int(passed.sum())
+        overtaken |= passed
+
+    traffic.remove(np.abs(z - car_z) >= traffic_range)
+
+
+def move_few_cpu_cars(state, forward_speed):
+    """move_cpu_cars() on lists of floats, for the few cars of an ordinary game,
+    where NumPy's cost per call outweighs the work"""
+    traffic = state.cpu_cars
+    car_x = state.car_x
+    car_z = state.car_z
+    count = traffic.count
+    if not count:
+        return
+
+    xs = traffic.x[:count].tolist()
+    zs = traffic.z[:count].tolist()
+    speeds = traffic.speed[:count].tolist()
+    targets = traffic.target_x[:count].tolist()
+    start_x = xs[:]
+    start_z = zs[:]
+    middle, reach = window(car_z, car_z, rear_end_box, max(speeds) + 2 * max_acceleration)
+
+    if drive_lists(xs, zs, speeds, targets, traffic.desired_speed[:count].tolist(), [0] * count,
+                   [car_x], [car_z], [forward_speed]):
+        traffic.x[:count] = xs
+        traffic.target_x[:count] = targets
+    traffic.z[:count] = zs
+    traffic.speed[:count] = speeds
+
+    overtaken = traffic.overtaken[:count].tolist()
+    leaving = False
+    for i in range(count):
+        z = zs[i]
+        # Running into a CPU car ahead, at any point of the traffic's move
+        if abs(start_z[i] - middle) <= reach \
+                and collide_one(start_x[i], start_z[i], xs[i], z, car_x, car_z, car_x, car_z, rear_end_box):
+            state.game_over = True
+        if z > car_z and not overtaken[i]:
+            state.score += 100
+            traffic.overtaken[i] = True
+        if abs(z - car_z) >= traffic_range:
+            leaving = True
+
+    if leaving:
+        traffic.remove([abs(z - car_z) >= traffic_range for z in zs])
+
+
+def step(state, inputs):
+    """Advance the game by one fixed tick.
+
+    The traffic moves once per tick, then the player car moves and streams the
+    road forward. Each move is checked for collisions over its whole length
+    (see collision.py), so no speed is fast enough to skip past a car.
+    """
+    update_cpu_cars(state)
+    update_car(state, inputs)
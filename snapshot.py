@@ -0,0 +1,215 @@
+"""Binary snapshots of a complete GameState.
+
+A snapshot is a fixed header followed by the state's arrays (road ring, trees,
+houses and their colors, random generator state, CPU car columns), each stored
+raw at an 8 byte aligned offset. Nothing has to be parsed to get at the data:
+unpack() takes NumPy views of the arrays straight out of whatever buffer holds
+the snapshot, including a memory-mapped file.
+
+A checkpoint file holds many snapshots behind an index of their offsets, so
+
+    save_checkpoints("late_game.ckpt", states)
+    checkpoints = Checkpoints("late_game.ckpt")
+    state = checkpoints[123]
+
+maps the file once and only reads the snapshots that are restored.
+"""
+import math
+import mmap
+import struct
+
+import numpy as np
+
+from simulation import GameState
+from traffic import TrafficStore
+
+magic = b"HWSS"
+version = 3
+house_parts = ("body", "door", "windows", "roof")
+
+header = struct.Struct(
+    "<4sI"      # magic, version
+    "5d"        # car_x, car_y, car_z, car_rotation, car_speed
+    "qQqq"      # score, seed, next CPU car id, first scenery chunk
+    "4i"        # road_head, cpu_spawn_timer, cpu_spawn_interval, num_cars
+    "4I"        # road segment, tree, house and CPU car counts
+    "d??")      # random gauss_next, whether it is set, game_over
+
+checkpoint_magic = b"HWCK"
+# magic, version, snapshot count, then one (offset, size) pair per snapshot
+checkpoint_header = struct.Struct("<4sIQ")
+checkpoint_entry = struct.Struct("<QQ")
+
+# Python's Mersenne Twister state: 624 words and a position
+rng_words = 625
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(segments, trees, houses, cars):
+    """(name, dtype, shape, offset) of each array, and the total snapshot size"""
+    arrays = [
+        ("road_segments", np.float64, (segments,)),
+        ("trees", np.float64, (trees, 3)),
+        ("house_positions", np.float64, (houses, 2)),
+        ("house_types", np.int64, (houses,)),
+        ("house_colors", np.float64, (houses, len(house_parts), 3)),
+        ("rng", np.uint32, (rng_words,)),
+        ("car_x", np.float64, (cars,)),
+        ("car_z", np.float64, (cars,)),
+        ("car_speed", np.float64, (cars,)),
+        ("car_target_x", np.float64, (cars,)),
+        ("car_desired_speed", np.float64, (cars,)),
+        ("car_color", np.float64, (cars, 3)),
+        ("car_ids", np.int64, (cars,)),
+        ("car_overtaken", np.bool_, (cars,)),
+    ]
+    layout = []
+    offset = _align(header.size)
+    for name, dtype, shape in arrays:
+        layout.append((name, dtype, shape, offset))
+        offset = _align(offset + math.prod(shape) * np.dtype(dtype).itemsize)
+    return layout, offset
+
+
+def _views(buffer, layout, base):
+    return {name: np.frombuffer(buffer, dtype, math.prod(shape), base + offset).reshape(shape)
+            for name, dtype, shape, offset in layout}
+
+
+def pack(state):
+    """The state as snapshot bytes"""
+    traffic = state.cpu_cars
+    count = traffic.count
+    _, words, gauss_next = state.rng.getstate()
+    layout, size = _layout(len(state.road_segments), len(state.trees), len(state.houses), count)
+
+    data = bytearray(size)
+    header.pack_into(
+        data, 0, magic, version,
+        state.car_x, state.car_y, state.car_z, state.car_rotation, state.car_speed,
+        state.score, state.seed, traffic.next_id, state.scenery_chunk,
+        state.road_head, state.cpu_spawn_timer, state.cpu_spawn_interval, state.num_cars,
+        len(state.road_segments), len(state.trees), len(state.houses), count,
+        gauss_next or 0.0, gauss_next is not None, state.game_over)
+
+    arrays = _views(data, layout, 0)
+    arrays["road_segments"][:] = state.road_segments
+    if state.trees:
+        arrays["trees"][:] = state.trees
+    if state.houses:
+        houses = np.array(state.houses, dtype=np.float64)
+        arrays["house_positions"][:] = houses[:, :2]
+        arrays["house_types"][:] = houses[:, 2]
+        arrays["house_colors"][:] = [[colors[part] for part in house_parts] for colors in state.house_colors]
+    arrays["rng"][:] = words
+    arrays["car_x"][:] = traffic.x[:count]
+    arrays["car_z"][:] = traffic.z[:count]
+    arrays["car_speed"][:] = traffic.speed[:count]
+    arrays["car_target_x"][:] = traffic.target_x[:count]
+    arrays["car_desired_speed"][:] = traffic.desired_speed[:count]
+    arrays["car_color"][:] = traffic.color[:count]
+    arrays["car_ids"][:] = traffic.ids[:count]
+    arrays["car_overtaken"][:] = traffic.overtaken[:count]
+    return bytes(data)
+
+
+def unpack(buffer, offset=0):
+    """A new GameState from the snapshot at offset in buffer (bytes, mmap or anything with the buffer protocol)"""
+    (tag, snapshot_version,
+     car_x, car_y, car_z, car_rotation, car_speed,
+     score, seed, next_id, scenery_chunk,
+     road_head, spawn_timer, spawn_interval, num_cars,
+     segments, trees, houses, cars,
+     gauss_next, has_gauss, game_over) = header.unpack_from(buffer, offset)
+    if tag != magic or snapshot_version != version:
+        raise ValueError(f"not a version {version} game snapshot")
+    layout, _ = _layout(segments, trees, houses, cars)
+    arrays = _views(buffer, layout, offset)
+
+    state = GameState(seed)
+    state.rng.setstate((3, tuple(arrays["rng"].tolist()), gauss_next if has_gauss else None))
+    state.car_x = car_x
+    state.car_y = car_y
+    state.car_z = car_z
+    state.car_rotation = car_rotation
+    state.car_speed = car_speed
+    state.game_over = game_over
+    state.score = score
+    state.cpu_spawn_timer = spawn_timer
+    state.cpu_spawn_interval = spawn_interval
+    state.num_cars = num_cars
+
+    state.road_segments = arrays["road_segments"].tolist()
+    state.road_head = road_head
+    state.trees = arrays["trees"].tolist()
+    types = arrays["house_types"].tolist()
+    state.houses = [[x, z, house_type] for (x, z), house_type in zip(arrays["house_positions"].tolist(), types)]
+    state.house_colors = [dict(zip(house_parts, colors)) for colors in arrays["house_colors"].tolist()]
+    state.scenery_chunk = scenery_chunk
+
+    traffic = state.cpu_cars = TrafficStore(max(cars, state.cpu_cars.capacity))
+    traffic.count = cars
+    traffic.x[:cars] = arrays["car_x"]
+    traffic.z[:cars] = arrays["car_z"]
+    traffic.speed[:cars] = arrays["car_speed"]
+    traffic.target_x[:cars] = arrays["car_target_x"]
+    traffic.desired_speed[:cars] = arrays["car_desired_speed"]
+    traffic.color[:cars] = arrays["car_color"]
+    traffic.ids[:cars] = arrays["car_ids"]
+    traffic.overtaken[:cars] = arrays["car_overtaken"]
+    traffic.next_id = next_id
+    state.traffic_index.rebuild(traffic)
+    return state
+
+
+def save(path, state):
+    with open(path, "wb") as f:
+        f.write(pack(state))
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return unpack(f.read())
+
+
+def save_checkpoints(path, states):
+    """Write the states as one checkpoint file"""
+    snapshots = [pack(state) for state in states]
+    offset = _align(checkpoint_header.size + checkpoint_entry.size * len(snapshots))
+    index = []
+    for snapshot in snapshots:
+        index.append((offset, len(snapshot)))
+        offset = _align(offset + len(snapshot))
+
+    with open(path, "wb") as f:
+        f.write(checkpoint_header.pack(checkpoint_magic, version, len(snapshots)))
+        for entry in index:
+            f.write(checkpoint_entry.pack(*entry))
+        for (offset, _), snapshot in zip(index, snapshots):
+            f.seek(offset)
+            f.write(snapshot)
+
+
+class Checkpoints:
+    """The snapshots of a checkpoint file, memory-mapped and restored on demand"""
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        tag, file_version, count = checkpoint_header.unpack_from(self.map)
+        if tag != checkpoint_magic or file_version != version:
+            self.map.close()
+            raise ValueError(f"{path} is not a version {version} checkpoint file")
+        self.index = np.frombuffer(self.map, np.uint64, 2 * count, checkpoint_header.size).reshape(count, 2)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        return unpack(self.map, int(self.index[i, 0]))
+
+    def close(self):
+        del self.index
+        self.map.close()
@@ -0,0 +1,30 @@
+"""Sorted-by-z index over the CPU cars.
+
+The index is the traffic's slots ordered by z, rebuilt with one argsort after the
+traffic moves. Every question the simulation asks (is anything near the player,
+is this spawn spot free) only reaches a couple of units along the road, so it is
+answered with two binary searches and a look at the few cars between them,
+instead of a scan of every car.
+"""
+import numpy as np
+
+
+class TrafficIndex:
+    def __init__(self):
+        self.order = np.zeros(0, dtype=np.int64)
+        self.sorted_z = np.zeros(0)
+
+    def rebuild(self, traffic):
+        z = traffic.z[:traffic.count]
+        self.order = np.argsort(z, kind="stable")
+        self.sorted_z = z[self.order]
+
+    @property
+    def count(self):
+        return len(self.order)
+
+    def near(self, z, reach):
+        """Slots of the cars whose z is within reach of z"""
+        first = self.sorted_z.searchsorted(z - reach, side="left")
+        last = self.sorted_z.searchsorted(z + reach, side="right")
+        return self.order[first:last]
@@ -0,0 +1,137 @@
+"""Hilly terrain on both sides of the road, in square tiles.
+
+Heights come from a few octaves of value noise evaluated at world coordinates,
+so neighbouring tiles meet without seams. They fade to zero within
+flat_distance of the road's center line, so the ground under the road, trees and
+houses stays at road height. Each tile is meshed once into its own vertex buffer
+when it first comes into range; tiles are kept in an LRU cache and released when
+it overflows. Drawing costs the same number of tiles wherever the car is.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from geometry import VertexBuffer
+
+tile_size = 100.0
+tile_cells = 16
+cache_size = 64
+
+# Range of tiles around the car, in world units
+view_ahead = 300.0
+view_behind = 100.0
+view_side = 300.0
+
+# Ground is flat up to flat_distance from the road's center line, then rises to
+# full height over ramp_distance
+flat_distance = 30.0
+ramp_distance = 30.0
+
+# (feature size, height) of each noise octave
+octaves = [(80.0, 9.0), (35.0, 4.0), (15.0, 1.5)]
+max_height = sum(height for _, height in octaves)
+
+grass_color = np.array([0.0, 0.6, 0.0])
+hilltop_color = np.array([0.3, 0.5, 0.15])
+
+
+def _lattice(ix, iz, octave):
+    """Pseudo-random value in [0, 1) for each integer lattice point"""
+    h = (ix.astype(np.int64) * 374761393 + iz.astype(np.int64) * 668265263 + octave * 144665) & 0xFFFFFFFF
+    h = ((h ^ (h >> 13)) * 1274126177) & 0xFFFFFFFF
+    h ^= h >> 16
+    return h / 2.0 ** 32
+
+
+def _value_noise(x, z, octave):
+    x0 = np.floor(x)
+    z0 = np.floor(z)
+    fx = x - x0
+    fz = z - z0
+    fx = fx * fx * (3 - 2 * fx)
+    fz = fz * fz * (3 - 2 * fz)
+    ix = x0.astype(np.int64)
+    iz = z0.astype(np.int64)
+    top = _lattice(ix, iz, octave) * (1 - fx) + _lattice(ix + 1, iz, octave) * fx
+    bottom = _lattice(ix, iz + 1, octave) * (1 - fx) + _lattice(ix + 1, iz + 1, octave) * fx
+    return top * (1 - fz) + bottom * fz
+
+
+def height(x, z):
+    """Ground height at world (x, z); arrays of the same shape in, array out"""
+    h = np.zeros(np.shape(x))
+    for octave, (size, amplitude) in enumerate(octaves):
+        h += amplitude * _value_noise(x / size, z / size, octave)
+    t = np.clip((np.abs(x) - flat_distance) / ramp_distance, 0.0, 1.0)
+    return h * t * t * (3 - 2 * t)
+
+
+def tile_mesh(ix, iz):
+    """Triangles of the tile covering x in [ix, ix + 1) * tile_size, likewise z"""
+    cell = tile_size / tile_cells
+    # One extra row of heights on every side for the normals at the edges
+    steps = np.arange(-1, tile_cells + 2) * cell
+    x, z = np.meshgrid(ix * tile_size + steps, iz * tile_size + steps)
+    h = height(x, z)
+
+    dh_dx = (h[1:-1, 2:] - h[1:-1, :-2]) / (2 * cell)
+    dh_dz = (h[2:, 1:-1] - h[:-2, 1:-1]) / (2 * cell)
+    normals = np.stack([-dh_dx, np.ones_like(dh_dx), -dh_dz], axis=-1)
+    normals /= np.linalg.norm(normals, axis=-1, keepdims=True)
+
+    h = h[1:-1, 1:-1]
+    points = np.stack([x[1:-1, 1:-1], h, z[1:-1, 1:-1]], axis=-1)
+    shade = (h / max_height)[..., None]
+    colors = grass_color * (1 - shade) + hilltop_color * shade
+    grid = np.concatenate([points, normals, colors], axis=-1)
+
+    # Rows of the grid run along x; each cell is two triangles wound counterclockwise from above
+    a = grid[:-1, :-1]
+    b = grid[1:, :-1]
+    c = grid[1:, 1:]
+    d = grid[:-1, 1:]
+    triangles = np.stack([a, b, c, a, c, d], axis=2)
+    return triangles.reshape(-1, 9).astype(np.float32)
+
+
+class Terrain:
+    def __init__(self):
+        self.tiles = OrderedDict()
+        self.drawn = 0
+        self.in_range = 0
+
+    def tile(self, ix, iz):
+        """The tile's vertex buffer, meshed on first use"""
+        key = (ix, iz)
+        buffer = self.tiles.get(key)
+        if buffer is None:
+            buffer = self.tiles[key] = VertexBuffer()
+            buffer.upload(tile_mesh(ix, iz))
+            if len(self.tiles) > cache_size:
+                _, evicted = self.tiles.popitem(last=False)
+                evicted.release()
+        else:
+            self.tiles.move_to_end(key)
+        return buffer
+
+    def draw(self, state, frustum=None):
+        x_tiles = range(int(np.floor(-view_side / tile_size)), int(np.ceil(view_side / tile_size)))
+        z_tiles = range(int(np.floor((state.car_z - view_ahead) / tile_size)),
+                        int(np.ceil((state.car_z + view_behind) / tile_size)))
+        keys = [(ix, iz) for iz in z_tiles for ix in x_tiles]
+        self.in_range = len(keys)
+
+        if frustum is not None:
+            centers = np.array([((ix + 0.5) * tile_size, max_height / 2, (iz + 0.5) * tile_size) for ix, iz in keys])
+            radius = tile_size * 0.71 + max_height / 2
+            visible = frustum.spheres_visible(centers, np.full(len(keys), radius))
+            keys = [key for key, shown in zip(keys, visible) if shown]
+
+        for ix, iz in keys:
+            self.tile(ix, iz).draw()
+        self.drawn = len(keys)
+
+    def release(self):
+        for buffer in self.tiles.values():
+            buffer.release()
+        self.tiles.clear()
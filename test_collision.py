@@ -0,0 +1,76 @@
+"""A fast player car must not pass through a stopped CPU car, in one game or in a batch of them."""
+import numpy as np
+import pytest
+
+import batch_sim
+import simulation
+from simulation import INPUT_FORWARD, Inputs
+
+speeds = [0.5, 1.5, 4.0, 10.0]
+# Across the player's lane, inside the rear-end box but mostly outside the wheel box
+lateral_offsets = [-0.9, -0.5, -0.3, -0.25, 0.0, 0.25, 0.3, 0.5, 0.9]
+distance = 50.0
+
+
+def layouts(speed):
+    """(x, z) of the stopped car, spread over one tick of the player's travel"""
+    return [(x, -distance - float(step)) for x in lateral_offsets for step in np.linspace(0, speed, 5, endpoint=False)]
+
+
+def ticks_to_pass(speed):
+    return int((distance + speed + 5) / speed) + 1
+
+
+def single_game_crash_tick(speed, x, z):
+    """The tick a game with only the stopped car ends on, or None"""
+    state = simulation.new_game(1)
+    state.cpu_cars.clear()
+    state.traffic_index.rebuild(state.cpu_cars)
+    state.cpu_spawn_timer = -10 ** 9
+    state.cpu_cars.append(x, z, 0.0, (1.0, 1.0, 1.0), desired_speed=0.0)
+    state.car_speed = speed
+    for tick in range(ticks_to_pass(speed)):
+        simulation.step(state, Inputs(True))
+        if state.game_over:
+            return tick
+    return None
+
+
+def batch_crash_ticks(speed, cars):
+    """The tick each game of a batch, one stopped car each, ends on (-1 for never)"""
+    batch = batch_sim.BatchSimulation(len(cars), seed=1)
+    batch.cpu_spawn_timer[:] = -10 ** 9
+    batch.cpu_alive[:, 0] = True
+    batch.cpu_x[:, 0] = batch.cpu_target_x[:, 0] = [x for x, _ in cars]
+    batch.cpu_z[:, 0] = [z for _, z in cars]
+    batch.cpu_desired_speed[:, 0] = 0.0
+    batch.car_speed[:] = speed
+    crashed = np.full(len(cars), -1)
+    for tick in range(ticks_to_pass(speed)):
+        batch.step(np.full(len(cars), INPUT_FORWARD))
+        crashed[(crashed < 0) & batch.game_over] = tick
+    return crashed
+
+
+@pytest.mark.parametrize("speed", speeds)
+def test_fast_car_hits_stopped_car(speed, monkeypatch):
+    monkeypatch.setattr(simulation, "max_speed", speed)
+    monkeypatch.setattr(batch_sim, "max_speed", speed)
+    cars = layouts(speed)
+
+    single = [single_game_crash_tick(speed, x, z) for x, z in cars]
+    missed = [car for car, tick in zip(cars, single) if tick is None]
+    assert not missed, f"passed through the car at {missed}"
+
+    batch = batch_crash_ticks(speed, cars)
+    assert batch.tolist() == single
+
+
+@pytest.mark.parametrize("speed", speeds)
+def test_car_in_next_lane_is_missed(speed, monkeypatch):
+    monkeypatch.setattr(simulation, "max_speed", speed)
+    monkeypatch.setattr(batch_sim, "max_speed", speed)
+    cars = [(simulation.road_width / 4, z) for _, z in layouts(speed)]
+
+    assert all(single_game_crash_tick(speed, x, z) is None for x, z in cars)
+    assert (batch_crash_ticks(speed, cars) < 0).all()
@@ -0,0 +1,33 @@
+"""drive()'s plain Python path for a few cars must play out exactly like its NumPy path."""
+import numpy as np
+
+import driving
+
+
+def random_roads(rng, count, roads):
+    """Cars in or between the lanes of a few roads, some of them changing lanes, and one player car per road"""
+    x = rng.choice([-2.5, 0.0, 2.5], count) + np.where(rng.random(count) < 0.3, rng.uniform(-1, 1, count), 0.0)
+    target_x = np.where(rng.random(count) < 0.8, np.rint(x / 2.5) * 2.5, x)
+    z = -rng.uniform(0, rng.choice([10, 40, 200]), count)
+    speed = rng.uniform(0, 0.3, count)
+    desired_speed = rng.uniform(0.15, 0.25, count)
+    group = rng.integers(0, roads, count)
+    obstacles = (rng.uniform(-3, 3, roads), -rng.uniform(0, 40, roads), rng.uniform(0, 0.5, roads))
+    return [x, z, speed, target_x], desired_speed, group, obstacles
+
+
+def test_few_cars_match_arrays(monkeypatch):
+    monkeypatch.setattr(driving, "few_cars", 0)
+    rng = np.random.default_rng(0)
+    lane_changes = 0
+    for _ in range(500):
+        moving, desired_speed, group, obstacles = random_roads(rng, int(rng.integers(1, 60)), int(rng.integers(1, 4)))
+        arrays = [column.copy() for column in moving]
+        few = [column.copy() for column in moving]
+        driving.drive(*arrays, desired_speed, group, *obstacles)
+        driving.drive_few(*few, desired_speed, group, *obstacles)
+        for expected, actual in zip(arrays, few):
+            np.testing.assert_array_equal(actual, expected)
+        lane_changes += int((arrays[3] != moving[3]).sum())
+    # The comparison has to cover lane changes, not just car-following
+    assert lane_changes > 100
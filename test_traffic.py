@@ -0,0 +1,35 @@
+"""Traffic leaves the road once it is far enough from the player, ahead or behind."""
+import numpy as np
+
+import batch_sim
+import simulation
+from simulation import INPUT_FORWARD, Inputs
+
+# Long enough for traffic that never leaves to pile up well past most_cars
+ticks = 20000
+batch_ticks = 6000
+# More cars than spawn in the time one takes to drop traffic_range behind at full throttle
+most_cars = 8
+
+
+def test_single_game_traffic_stays_bounded():
+    state = simulation.new_game(7)
+    counts = []
+    for _ in range(ticks):
+        simulation.step(state, Inputs(move_forward=True))
+        counts.append(len(state.cpu_cars))
+        if state.game_over:
+            simulation.restart_game(state)
+    assert max(counts) <= most_cars
+    # Still spawning at the end of the drive
+    assert max(counts[-2000:]) > 0
+
+
+def test_batch_traffic_stays_bounded():
+    batch = batch_sim.BatchSimulation(16, seed=7)
+    most = 0
+    for _ in range(batch_ticks):
+        batch.step(np.full(batch.num_games, INPUT_FORWARD))
+        most = max(most, int(batch.cpu_alive.sum(axis=1).max()))
+        batch.reset(batch.game_over)
+    assert most <= most_cars < batch.max_cpu_cars
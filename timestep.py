@@ -0,0 +1,84 @@
+"""Fixed-timestep scheduling and render interpolation.
+
+The simulation always advances in ticks of 1 / tick_rate seconds, no matter how
+fast frames are drawn. A frame runs however many ticks the elapsed wall time
+asks for (capped, so a stall doesn't snowball), and the renderer blends the last
+two ticks by the leftover fraction so motion stays smooth between ticks.
+"""
+import copy
+
+import numpy as np
+
+
+class FixedTimestep:
+    def __init__(self, tick_rate=60, max_substeps=5):
+        self.tick_rate = tick_rate
+        self.tick_ms = 1000.0 / tick_rate
+        self.max_substeps = max_substeps
+        self.last_time = None
+        self.accumulator = 0.0
+
+    def reset(self, now_ms=None):
+        self.last_time = now_ms
+        self.accumulator = 0.0
+
+    def advance(self, now_ms):
+        """Return how many ticks to run for the time elapsed up to now_ms"""
+        if self.last_time is None:
+            self.last_time = now_ms
+            return 0
+
+        self.accumulator += now_ms - self.last_time
+        self.last_time = now_ms
+
+        ticks = int(self.accumulator // self.tick_ms)
+        if ticks > self.max_substeps:
+            # Too far behind to catch up: drop the backlog instead of spiralling
+            ticks = self.max_substeps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= ticks * self.tick_ms
+        return ticks
+
+    @property
+    def alpha(self):
+        """How far the current time is between the last tick and the next one"""
+        return min(self.accumulator / self.tick_ms, 1.0)
+
+
+def capture_motion(state):
+    """Remember the moving parts of a state so the next tick can be blended from it"""
+    traffic = state.cpu_cars
+    count = traffic.count
+    return (state.car_x, state.car_z, state.car_rotation,
+            traffic.ids[:count].copy(), traffic.x[:count].copy(), traffic.z[:count].copy())
+
+
+def interpolate_state(previous, state, alpha):
+    """Return a copy of state with the player and CPU cars moved back towards previous.
+
+    alpha is 0 at the previous tick and 1 at the current one. Cars spawned since
+    the previous tick are drawn where they are.
+    """
+    if previous is None or alpha >= 1.0:
+        return state
+
+    car_x, car_z, car_rotation, ids, xs, zs = previous
+    view = copy.copy(state)
+    view.car_x = car_x + (state.car_x - car_x) * alpha
+    view.car_z = car_z + (state.car_z - car_z) * alpha
+    view.car_rotation = car_rotation + (state.car_rotation - car_rotation) * alpha
+
+    traffic = view.cpu_cars = state.cpu_cars.copy()
+    count = traffic.count
+    if count and len(ids):
+        # Match each car to its previous position by id
+        order = np.argsort(ids)
+        slots = np.searchsorted(ids, traffic.ids[:count], sorter=order)
+        slots = order[np.minimum(slots, len(ids) - 1)]
+        known = ids[slots] == traffic.ids[:count]
+        x = traffic.x[:count]
+        z = traffic.z[:count]
+        x[known] = xs[slots[known]] + (x[known] - xs[slots[known]]) * alpha
+        z[known] = zs[slots[known]] + (z[known] - zs[slots[known]]) * alpha
+    return view
@@ -0,0 +1,89 @@
+"""Struct-of-arrays storage for the CPU cars.
+
+Each car attribute is a NumPy column, so the whole traffic moves with a single
+z -= speed. The columns are allocated with spare capacity that only ever grows,
+and cars that leave are removed by moving cars from the end of the columns into
+their slots, so a tick allocates nothing unless the traffic outgrows the store.
+Slots are not kept in spawn order; each car has a unique id instead.
+
+Besides where it is, each car has the x of the lane it is heading for
+(target_x) and the speed it would like to drive at; see driving.py.
+"""
+import numpy as np
+
+
+class TrafficStore:
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.next_id = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.x = np.zeros(capacity)
+        self.z = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.target_x = np.zeros(capacity)
+        self.desired_speed = np.zeros(capacity)
+        self.color = np.zeros((capacity, 3))
+        self.overtaken = np.zeros(capacity, dtype=bool)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return len(self.x)
+
+    def _columns(self):
+        return (self.x, self.z, self.speed, self.target_x, self.desired_speed, self.color, self.overtaken, self.ids)
+
+    def _grow(self):
+        old = self._columns()
+        self._allocate(max(2 * self.capacity, 16))
+        for new, column in zip(self._columns(), old):
+            new[:self.count] = column[:self.count]
+
+    def append(self, x, z, speed, color, overtaken=False, target_x=None, desired_speed=None):
+        """Add a car and return its slot; by default it keeps to x at speed"""
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        self.x[i] = x
+        self.z[i] = z
+        self.speed[i] = speed
+        self.target_x[i] = x if target_x is None else target_x
+        self.desired_speed[i] = speed if desired_speed is None else desired_speed
+        self.color[i] = color
+        self.overtaken[i] = overtaken
+        self.ids[i] = self.next_id
+        self.next_id += 1
+        self.count += 1
+        return i
+
+    def remove(self, mask):
+        """Drop the cars where mask (one entry per live car) is True"""
+        removed = np.flatnonzero(mask)
+        if not removed.size:
+            return
+        remaining = self.count - removed.size
+        # Slots below the new count that are freed get filled with the cars still
+        # living above it
+        holes = removed[removed < remaining]
+        above = np.ones(self.count - remaining, dtype=bool)
+        above[removed[removed >= remaining] - remaining] = False
+        movers = remaining + np.flatnonzero(above)
+        for column in self._columns():
+            column[holes] = column[movers]
+        self.count = remaining
+
+    def clear(self):
+        self.count = 0
+
+    def copy(self):
+        other = TrafficStore(max(self.count, 1))
+        for new, column in zip(other._columns(), self._columns()):
+            new[:self.count] = column[:self.count]
+        other.count = self.count
+        other.next_id = self.next_id
+        return other
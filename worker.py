@@ -0,0 +1,126 @@
+"""Stepping the game on a worker thread while the window renders (--threaded).
+
+The worker owns the GameState and runs its ticks on their own fixed timestep,
+so a slow tick holds back the next snapshot rather than the next frame. After
+every tick it publishes a snapshot: a copy of the state that later ticks leave
+alone. The newest two snapshots go out together as one tuple, replaced by a
+single assignment, so the render thread picks up the latest pair without a lock
+and blends between them the way the single-threaded loop blends its last two
+ticks.
+
+The renderers follow the road and scenery by list identity and changed-slot
+sets (see road.py and instancing.py). Every snapshot has lists of its own, so
+RenderView keeps one set of lists for the renderer and patches in the slots that
+differ from the last snapshot it showed.
+"""
+import copy
+import queue
+import threading
+import time
+
+from timestep import FixedTimestep, capture_motion, interpolate_state
+
+# (list, set of its changed slots) pairs the renderers read from a GameState
+tracked = [("road_segments", "changed_road_segments"), ("trees", "changed_trees"),
+           ("houses", "changed_houses"), ("house_colors", "changed_houses")]
+
+
+def snapshot(state):
+    """A copy of state that stepping state further leaves alone"""
+    frozen = copy.copy(state)
+    for name, _ in tracked:
+        setattr(frozen, name, list(getattr(state, name)))
+    frozen.cpu_cars = state.cpu_cars.copy()
+    return frozen
+
+
+class RenderView:
+    """Road and scenery lists owned by the render thread, kept in step with the snapshots"""
+    def __init__(self):
+        self.shown = None
+        self.view = None
+        self.lists = {name: [] for name, _ in tracked}
+        self.changed = {changed: set() for _, changed in tracked}
+
+    def update(self, snapshot):
+        """A state to render for snapshot, sharing this view's lists"""
+        if snapshot is self.shown:
+            return self.view
+        view = copy.copy(snapshot)
+        for name, changed in tracked:
+            mine = self.lists[name]
+            theirs = getattr(snapshot, name)
+            slots = self.changed[changed]
+            if len(mine) != len(theirs):
+                # A new list tells the renderers to start over
+                mine = self.lists[name] = list(theirs)
+                slots.update(range(len(theirs)))
+            else:
+                # Ticks replace recycled slots with new objects and leave the rest be
+                for i, (old, new) in enumerate(zip(mine, theirs)):
+                    if old is not new:
+                        mine[i] = new
+                        slots.add(i)
+            setattr(view, name, mine)
+            setattr(view, changed, slots)
+        self.shown = snapshot
+        self.view = view
+        return view
+
+
+class SimulationWorker:
+    """Calls advance() tick_rate times a second on a thread of its own and publishes the state after each tick"""
+    def __init__(self, advance, state, tick_rate=60, max_substeps=5):
+        self.advance = advance
+        self.state = state
+        self.clock = FixedTimestep(tick_rate, max_substeps)
+        self.requests = queue.SimpleQueue()
+        self.render_view = RenderView()
+        first = snapshot(state)
+        self.published = (first, first, time.perf_counter())
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="simulation", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def request(self, function):
+        """Have the worker call function between two ticks"""
+        self.requests.put(function)
+
+    def publish(self, restarted=False):
+        latest = snapshot(self.state)
+        previous = latest if restarted else self.published[1]
+        self.published = (previous, latest, time.perf_counter())
+
+    def run(self):
+        self.clock.reset(time.perf_counter() * 1000)
+        while self.running:
+            if not self.requests.empty():
+                while not self.requests.empty():
+                    self.requests.get()()
+                self.publish(restarted=True)
+
+            for _ in range(self.clock.advance(time.perf_counter() * 1000)):
+                if not self.advance():
+                    self.running = False
+                    break
+                self.publish()
+
+            time.sleep(max(self.clock.tick_ms - self.clock.accumulator, 0.0) / 1000)
+
+    def frame(self):
+        """The state to draw now: the latest tick, blended back towards the one before"""
+        previous, latest, published = self.published
+        alpha = min((time.perf_counter() - published) * 1000 / self.clock.tick_ms, 1.0)
+        view = self.render_view.update(latest)
+        motion = None if previous is latest else capture_motion(previous)
+        return interpolate_state(motion, view, alpha)